@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import glob
+import gzip
+import json
+import os
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+import httpx
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Headers worth replaying; everything else is browser noise or set by httpx
+REPLAY_HEADERS = {"authorization", "accept", "content-type", "accept-language"}
+
+ITEM_NAME_KEYS = os.getenv('ASPIRE_API_ITEM_NAME_KEYS', 'ServiceItemTypeName,ServiceItemType,serviceItemType,Name,name').split(',')
+ITEM_VALUE_KEYS = os.getenv('ASPIRE_API_ITEM_VALUE_KEYS', 'Quantity,Value,value,Measurement,measurement').split(',')
+
+JWT_PATTERN = re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]+")
+
+
+# === Captured traffic ===
+def parse_network_trace(trace_path):
+    # Reads the gzipped JSONL traces written by NetworkTraceWriter
+    entries = []
+    with gzip.open(trace_path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                event = json.loads(line)
+                if event["type"] == "failed":
+                    continue
+                entries.append({
+                    "kind": event["type"],
+                    "method": event.get("method"),
+                    "url": event["url"],
+                    "status": event.get("status"),
+                    "headers": {k.lower(): v for k, v in event.get("headers", {}).items()},
+                    # A capped body is not a usable request shape or recording
+                    "body": "" if event.get("body_truncated") else (event.get("body") or ""),
+                    "truncated": bool(event.get("body_truncated")),
+                })
+        except (EOFError, ValueError):
+            pass  # trace of a run that is still writing
+
+    # Newest first, so the latest shapes and token win
+    return entries[::-1]
+
+
+def parse_api_log(log_path):
+    if log_path.endswith(".jsonl.gz"):
+        return parse_network_trace(log_path)
+
+    # Older text logs written line by line during the run
+    entries = []
+    current = None
+    section = None
+
+    with open(log_path, encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.startswith("🔹 [API] "):
+                method, _, url = line[len("🔹 [API] "):].partition(" ")
+                current = {"kind": "request", "method": method, "url": url, "headers": {}, "body": ""}
+                entries.append(current)
+                section = None
+            elif line.startswith("Response [") and "] for " in line:
+                status, _, url = line[len("Response ["):].partition("] for ")
+                current = {"kind": "response", "status": int(status), "url": url, "headers": {}, "body": ""}
+                entries.append(current)
+                section = None
+            elif current is None:
+                continue
+            elif line in ("Headers:", "Body:", "Response Body:"):
+                section = line
+            elif section == "Headers:" and line.startswith("  ") and ": " in line:
+                k, _, v = line.strip().partition(": ")
+                current["headers"][k.lower()] = v
+            elif section in ("Body:", "Response Body:"):
+                current["body"] += line + "\n"
+
+    for entry in entries:
+        entry["body"] = entry["body"].strip()
+    return entries[::-1]
+
+
+def load_captured_entries(log_paths):
+    entries = []
+    for log_path in log_paths:
+        entries.extend(parse_api_log(log_path))
+    return entries
+
+
+def find_log_files(log_folder):
+    # Newest first, so the most recent shapes and token win
+    return sorted(glob.glob(os.path.join(log_folder, "api_logs_*")), key=os.path.getmtime, reverse=True)
+
+
+def find_captured_request(entries, url_pattern, methods, exclude_pattern=None):
+    pattern = re.compile(url_pattern, re.IGNORECASE)
+    exclude = re.compile(exclude_pattern, re.IGNORECASE) if exclude_pattern else None
+    for entry in entries:
+        if (entry["kind"] == "request" and entry["method"] in methods and pattern.search(entry["url"])
+                and not (exclude and exclude.search(entry["url"]))):
+            return entry
+    return None
+
+
+def find_token(entries):
+    for entry in entries:
+        auth = entry["headers"].get("authorization", "")
+        if entry["kind"] == "request" and auth.lower().startswith("bearer "):
+            return auth[len("bearer "):]
+    return None
+
+
+def find_token_in_storage_state(state):
+    # Aspire keeps its access token in localStorage, sometimes wrapped in JSON
+    for origin in state.get("origins", []):
+        for item in origin.get("localStorage", []):
+            match = JWT_PATTERN.search(item.get("value", ""))
+            if match:
+                return match.group(0)
+    return None
+
+
+# === Takeoff documents ===
+def normalize_name(name):
+    return " ".join(str(name).split()).lower()
+
+
+def iter_takeoff_items(document):
+    # Any object carrying both a service item name and a value is a takeoff item
+    if isinstance(document, dict):
+        name_key = next((k for k in ITEM_NAME_KEYS if isinstance(document.get(k), str)), None)
+        value_key = next((k for k in ITEM_VALUE_KEYS if k in document), None)
+        if name_key and value_key:
+            yield document, name_key, value_key
+        for value in document.values():
+            yield from iter_takeoff_items(value)
+    elif isinstance(document, list):
+        for value in document:
+            yield from iter_takeoff_items(value)
+
+
+def apply_takeoff_values(document, df):
+    values = {normalize_name(name): value for name, value in zip(df["serviceItemType"], df["value"])}
+    names = {normalize_name(name): str(name) for name in df["serviceItemType"]}
+    report = {"filled": [], "missing": [], "not_editable": []}
+
+    found = set()
+    for item, name_key, value_key in iter_takeoff_items(document):
+        key = normalize_name(item[name_key])
+        if key in values:
+            value = values[key]
+            item[value_key] = value.item() if hasattr(value, "item") else value
+            found.add(key)
+
+    report["filled"] = [names[key] for key in values if key in found]
+    report["missing"] = [names[key] for key in values if key not in found]
+    return report
+
+
+# === Client ===
+class AspireApiClient:
+
+    def __init__(self, load_request, save_request, token=None, base_url=None, template_property_id=None, max_connections=10, timeout=30):
+        self.load_request = load_request
+        self.save_request = save_request
+        self.base_url = base_url or os.getenv('ASPIRE_API_BASE_URL')
+        self.template_property_id = str(template_property_id or os.getenv('ASPIRE_PROPERTY_ID') or "")
+
+        headers = {k: v for k, v in save_request["headers"].items() if k in REPLAY_HEADERS}
+        if token:
+            headers["authorization"] = f"Bearer {token}"
+        self.client = httpx.AsyncClient(
+            headers=headers,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    @classmethod
+    def from_logs(cls, log_paths, token=None, **kwargs):
+        load_pattern = os.getenv('ASPIRE_TAKEOFF_API_PATTERN', 'takeoff')
+        save_pattern = os.getenv('ASPIRE_TAKEOFF_SAVE_PATTERN', load_pattern)
+        # Recalculation requests also POST to takeoff URLs; same exclusion as takeoff.save_takeoff
+        recalc_pattern = os.getenv('ASPIRE_TAKEOFF_RECALC_PATTERN', 'recalc')
+
+        # Newest trace first, and only as many traces as it takes to find both shapes and a token
+        entries = []
+        save_request = load_request = None
+        for log_path in log_paths:
+            entries.extend(parse_api_log(log_path))
+            save_request = find_captured_request(entries, save_pattern, ("PUT", "POST", "PATCH"), recalc_pattern)
+            load_request = find_captured_request(entries, load_pattern, ("GET",), recalc_pattern)
+            if save_request and load_request and (token or find_token(entries)):
+                break
+
+        if save_request is None:
+            raise ValueError(f"No captured takeoff save request matching '{save_pattern}'; save a takeoff through the UI once first")
+        if load_request is None and save_request.get("truncated"):
+            raise ValueError(f"The captured takeoff save body was truncated ({save_request['url']}); "
+                             "raise ASPIRE_TRACE_TAKEOFF_MAX_BODY_BYTES and save a takeoff through the UI again")
+        return cls(load_request, save_request, token=token or find_token(entries), **kwargs)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def url_for(self, captured_url, property_id):
+        parts = urlsplit(captured_url)
+        path = parts.path
+        if self.template_property_id:
+            path = re.sub(rf"(?<=/){re.escape(self.template_property_id)}(?=/|$)", str(property_id), path)
+        query = parts.query.replace(f"={self.template_property_id}", f"={property_id}") if self.template_property_id else parts.query
+
+        if self.base_url:
+            base = urlsplit(self.base_url)
+            return urlunsplit((base.scheme, base.netloc, path, query, ""))
+        return urlunsplit((parts.scheme, parts.netloc, path, query, ""))
+
+    async def fetch_takeoff(self, property_id):
+        if self.load_request is not None:
+            response = await self.client.get(self.url_for(self.load_request["url"], property_id))
+            response.raise_for_status()
+            try:
+                return response.json()
+            except ValueError:
+                raise ValueError(f"Takeoff response for property {property_id} is not JSON (empty or truncated body)") from None
+
+        # Without a captured load request the saved body is the only known shape
+        if str(property_id) != self.template_property_id:
+            raise ValueError("No captured takeoff load request; only the captured property can be replayed")
+        return json.loads(self.save_request["body"])
+
+    async def save_takeoff(self, property_id, document):
+        response = await self.client.request(
+            self.save_request["method"],
+            self.url_for(self.save_request["url"], property_id),
+            json=document,
+        )
+        response.raise_for_status()
+        return response
+
+    async def push_takeoff(self, property_id, df):
+        document = await self.fetch_takeoff(property_id)
+        report = apply_takeoff_values(document, df)
+        if report["filled"]:
+            response = await self.save_takeoff(property_id, document)
+            print(f"✅ Saved {len(report['filled'])} takeoff items for property {property_id} [{response.status_code}]")
+        return report
+
+    async def push_takeoffs(self, jobs, concurrency=10):
+        # jobs: iterable of (property_id, takeoff DataFrame)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(property_id, df):
+            async with semaphore:
+                try:
+                    return property_id, await self.push_takeoff(property_id, df)
+                except Exception as e:
+                    print(f"❌ API replay failed for property {property_id}: {e}")
+                    return property_id, {"filled": [], "missing": [], "not_editable": [], "error": str(e)}
+
+        return dict(await asyncio.gather(*(run(property_id, df) for property_id, df in jobs)))
+
+
+async def main(args):
+    log_paths = args.log or find_log_files(os.path.join("logs", "api_logs", "property_destination"))
+    token = None
+    if args.session:
+        with open(args.session) as f:
+            token = find_token_in_storage_state(json.load(f))
+
+    df = pd.read_csv(args.csv)
+    async with AspireApiClient.from_logs(log_paths, token=token, base_url=args.base_url) as client:
+        results = await client.push_takeoffs([(property_id, df) for property_id in args.property_id], concurrency=args.concurrency)
+    print(json.dumps(results, indent=2))
+
+
+def cli(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Push takeoff values straight to the Aspire API using captured request shapes.")
+    parser.add_argument("--property-id", action="append", required=True, help="Property to update; repeat for several")
+    parser.add_argument("--csv", default="takeoff_data.csv")
+    parser.add_argument("--log", action="append", help="Captured API log to read request shapes from (default: all property logs)")
+    parser.add_argument("--session", help="Cached session file to take the auth token from")
+    parser.add_argument("--base-url", help="Send requests here instead of the captured host, e.g. a local stand-in server")
+    parser.add_argument("--concurrency", type=int, default=10)
+    asyncio.run(main(parser.parse_args(argv)))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,105 @@
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from aspire_api import load_captured_entries
+
+
+# Local stand-in for the Aspire API: replays the responses recorded in the API
+# logs and remembers whatever is written to it, so the replay mode can run offline
+class RecordedResponses:
+
+    def __init__(self, entries):
+        self.lock = threading.Lock()
+        self.responses = {}
+        self.writes = []
+        # Logs are read newest first; keep the newest recording per path
+        for entry in entries:
+            if entry["kind"] == "response":
+                key = self.key(entry["url"])
+                if entry.get("truncated"):
+                    # Serving an empty 200 would look like a valid but empty document
+                    error = json.dumps({"error": f"Recorded body was truncated for {key}; raise ASPIRE_TRACE_TAKEOFF_MAX_BODY_BYTES"})
+                    self.responses.setdefault(key, (502, error))
+                else:
+                    self.responses.setdefault(key, (entry["status"], entry["body"]))
+
+    @staticmethod
+    def key(url):
+        parts = urlsplit(url)
+        return f"{parts.path}?{parts.query}" if parts.query else parts.path
+
+    def get(self, url):
+        with self.lock:
+            return self.responses.get(self.key(url))
+
+    def put(self, method, url, body):
+        with self.lock:
+            self.writes.append({"method": method, "url": url, "body": body})
+            # Later reads of the same document see the written values
+            self.responses[self.key(url)] = (200, body)
+
+
+def make_handler(recorded):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def send_json(self, status, body):
+            payload = body.encode("utf-8") if body else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            response = recorded.get(self.path)
+            if response is None:
+                self.send_json(404, json.dumps({"error": f"No recorded response for {self.path}"}))
+            else:
+                self.send_json(*response)
+
+        def do_write(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length).decode("utf-8")
+            recorded.put(self.command, self.path, body)
+            self.send_json(200, body)
+
+        do_POST = do_write
+        do_PUT = do_write
+        do_PATCH = do_write
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(log_paths, host="127.0.0.1", port=8765):
+    recorded = RecordedResponses(load_captured_entries(log_paths))
+    server = ThreadingHTTPServer((host, port), make_handler(recorded))
+    server.recorded = recorded
+    return server
+
+
+def cli(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Serve recorded Aspire API responses from captured logs.")
+    parser.add_argument("log", nargs="+", help="Captured API logs to replay")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    server = serve(args.log, args.host, args.port)
+    print(f"🧪 Serving {len(server.recorded.responses)} recorded responses on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    cli()
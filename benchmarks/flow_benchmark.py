@@ -0,0 +1,265 @@
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from urllib.request import urlopen
+
+# Runs the property and estimation flows against benchmarks/mock_aspire.py at several
+# takeoff sizes and reports wall time, per-row latency and memory. Run from the
+# repository root:
+#   python benchmarks/flow_benchmark.py --sizes 10,100,1000,10000 --modes bulk,incremental
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_root)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_aspire import serve  # noqa: E402
+
+
+def configure_environment(base_url, work_dir):
+    # The flows read their settings at import time, so this runs before importing them.
+    # Caches and ledgers go to a scratch folder so every benchmark starts cold.
+    os.environ.update({
+        "ASPIRE_LOGIN_URL": f"{base_url}/login",
+        "ASPIRE_LOGIN_EMAIL": "benchmark@example.com",
+        "ASPIRE_LOGIN_PASSWORD": "benchmark",
+        "ASPIRE_LOGIN_PIN": "0000",
+        "ASPIRE_LOGIN_DEVICE_NAME": "benchmark",
+        "ASPIRE_PROPERTY_BASE_URL": f"{base_url}/property",
+        "ASPIRE_ESTIMATION_BASE_URL": f"{base_url}/estimation",
+        "ASPIRE_AGENT_MODE": "scripted",
+        "ASPIRE_SESSION_CACHE_DIR": os.path.join(work_dir, "sessions"),
+        "ASPIRE_TRAJECTORY_CACHE_DIR": os.path.join(work_dir, "trajectories"),
+        "ASPIRE_ESTIMATION_LEDGER": os.path.join(work_dir, "estimation_uploads.json"),
+        "ASPIRE_STATIC_CACHE_DIR": os.path.join(work_dir, "static"),
+    })
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+async def js_heap_mb(page):
+    heap = await page.evaluate("() => performance.memory ? performance.memory.usedJSHeapSize : 0")
+    return heap / 1024 / 1024
+
+
+def last_span_seconds(tracer, name, since):
+    spans = [s for s in tracer.spans if s["name"] == name and s["start"] >= since]
+    return spans[-1]["seconds"] if spans else None
+
+
+def takeoff_frame(rows):
+    import pandas as pd
+
+    # Same item names the mock generates; values change with the size so reruns write
+    return pd.DataFrame({
+        "serviceItemType": [f"Service Item {i + 1:05d}" for i in range(rows)],
+        "value": [float(i % 97) + rows % 7 + 0.5 for i in range(rows)],
+    })
+
+
+def estimation_rows(rows):
+    return [
+        {"Group Name": f"Group {i // 100 + 1}", "Service Name": f"Service {i // 10 + 1}",
+         "Item Name": f"Item {i + 1:05d}", "Uom": "EA", "Qty": i % 50 + 1}
+        for i in range(rows)
+    ]
+
+
+def mock_state(base_url, property_id=""):
+    with urlopen(f"{base_url}/api/state?property_id={property_id}") as response:
+        return json.load(response)
+
+
+async def bench_property(pool_browser, base_url, mode, rows, run):
+    import property_destination
+    from clients import new_browser_context
+    from tracing import tracer
+
+    property_destination.aspire_fill_mode = mode
+    property_id = f"rows-{rows}-{mode}"
+    df = takeoff_frame(rows)
+    result = {"flow": "property", "mode": mode, "rows": rows, "run": run, "status": "ok", "error": None}
+
+    browser_context = new_browser_context(pool_browser)
+    since = time.time()
+    started = time.perf_counter()
+    try:
+        page = await property_destination.prepare_page(browser_context)
+        await property_destination.open_takeoff(pool_browser, browser_context, page, property_id)
+        result["open_s"] = time.perf_counter() - started
+
+        fill_started = time.perf_counter()
+        report = await property_destination.fill_and_save_takeoff(page, property_id, df)
+        result["fill_save_s"] = time.perf_counter() - fill_started
+        result["save_s"] = last_span_seconds(tracer, "takeoff.save", since) or 0.0
+        result["filled"] = len(report["filled"])
+        result["js_heap_mb"] = await js_heap_mb(page)
+    except Exception as e:
+        result["status"], result["error"] = "error", str(e)
+    finally:
+        await browser_context.close()
+    result["wall_s"] = time.perf_counter() - started
+
+    if result["status"] == "ok":
+        # Count the rows the mock actually received with the expected value
+        saved = mock_state(base_url, property_id)["values"]
+        expected = dict(zip(df["serviceItemType"], df["value"]))
+        result["verified"] = sum(abs(saved.get(name, float("nan")) - value) < 1e-6 for name, value in expected.items())
+        result["per_row_ms"] = (result["fill_save_s"] - result["save_s"]) * 1000 / rows
+    return result
+
+
+async def direct_import(browser_context, estimation_id, file_path):
+    # The import steps without the agent: the same page, driven by selectors
+    import estimation_destination
+    from scripted_actions import ScriptedExecutor
+
+    page = await browser_context.get_current_page()
+    url = estimation_destination.build_estimation_url(estimation_id)
+    session_cache = estimation_destination.session_cache
+    if not (await session_cache.restore(browser_context) and await session_cache.is_valid(page, url)):
+        executor = ScriptedExecutor(estimation_destination.get_controller(), browser_context)
+        failed_at, _ = await executor.run(estimation_destination.login_actions_for_estimation_destination)
+        if failed_at is not None:
+            raise RuntimeError(f"login failed at action {failed_at}")
+        await session_cache.save(browser_context)
+        await page.goto(url)
+
+    await page.click("button.ellipsis")
+    await page.click("#import-option")
+    await page.set_input_files("input[type='file']", file_path)
+    async with page.expect_response(lambda r: "/import" in r.url and r.request.method == "POST") as response:
+        await page.click("#import")
+    if not (await response.value).ok:
+        raise RuntimeError("import request failed")
+    return True
+
+
+async def bench_estimation(pool_browser, base_url, driver, rows, run):
+    import estimation_destination
+    from clients import new_browser_context
+
+    estimation_id = f"rows-{rows}"
+    result = {"flow": "estimation", "mode": driver, "rows": rows, "run": run, "status": "ok", "error": None}
+
+    started = time.perf_counter()
+    file_path, digest = await asyncio.to_thread(estimation_destination.prepare_estimation_file, estimation_id, estimation_rows(rows))
+    result["workbook_s"] = time.perf_counter() - started
+    result["workbook_kb"] = os.path.getsize(file_path) / 1024
+
+    browser_context = new_browser_context(pool_browser)
+    upload_started = time.perf_counter()
+    try:
+        page = await estimation_destination.prepare_page(browser_context)
+        if driver == "agent":
+            uploaded = await estimation_destination.upload_estimation(
+                pool_browser, browser_context, page, estimation_id, os.path.abspath(file_path), digest=digest)
+        else:
+            uploaded = await direct_import(browser_context, estimation_id, os.path.abspath(file_path))
+        if not uploaded:
+            result["status"], result["error"] = "error", "the import did not finish"
+        result["js_heap_mb"] = await js_heap_mb(page)
+    except Exception as e:
+        result["status"], result["error"] = "error", str(e)
+    finally:
+        await browser_context.close()
+    result["upload_s"] = time.perf_counter() - upload_started
+    result["wall_s"] = time.perf_counter() - started
+    result["per_row_ms"] = result["wall_s"] * 1000 / rows
+    return result
+
+
+async def run_benchmarks(args, base_url):
+    from clients import get_browser
+    from tracing import tracer
+
+    tracer.name = "flow_benchmark"
+    browser = get_browser()
+    results = []
+    try:
+        for rows in args.sizes:
+            for run in range(1, args.repeat + 1):
+                if "property" in args.flows:
+                    for mode in args.modes:
+                        if mode == "row" and rows > args.row_max_rows:
+                            print(f"⏭️ Skipping row mode at {rows} rows (over --row-max-rows {args.row_max_rows})")
+                            continue
+                        results.append(await measure(bench_property(browser, base_url, mode, rows, run), args.tracemalloc))
+                        print(format_result(results[-1]))
+                if "estimation" in args.flows:
+                    results.append(await measure(bench_estimation(browser, base_url, args.estimation_driver, rows, run), args.tracemalloc))
+                    print(format_result(results[-1]))
+    finally:
+        await browser.close()
+    return results
+
+
+async def measure(benchmark, trace_python):
+    # tracemalloc gives the Python peak of just this run but slows it down noticeably
+    if trace_python:
+        tracemalloc.start()
+    try:
+        result = await benchmark
+        if trace_python:
+            result["python_peak_mb"] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        if trace_python:
+            tracemalloc.stop()
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def format_result(result):
+    status = "✅" if result["status"] == "ok" else "❌"
+    line = (f"{status} {result['flow']:<10} {result['mode']:<11} {result['rows']:>6} rows  "
+            f"wall {result['wall_s']:7.1f}s  {result.get('per_row_ms', 0):8.2f} ms/row  "
+            f"rss {result['peak_rss_mb']:6.0f} MB  js heap {result.get('js_heap_mb', 0):5.1f} MB")
+    if result["flow"] == "property" and "verified" in result:
+        line += f"  saved {result['verified']}/{result['rows']}"
+    if result["error"]:
+        line += f"  error: {result['error']}"
+    return line
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the Aspire flows against the local mock app.")
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="Comma-separated takeoff sizes")
+    parser.add_argument("--flows", default="property,estimation", help="property, estimation or both")
+    parser.add_argument("--modes", default="bulk,incremental", help="Fill modes to compare: bulk, row, incremental, api")
+    parser.add_argument("--row-max-rows", type=int, default=100, help="Row mode waits per row; skip it above this size")
+    parser.add_argument("--estimation-driver", choices=["direct", "agent"], default="direct",
+                        help="direct drives the import dialog by selector; agent runs upload_estimation (needs the LLM "
+                             "or a recorded trajectory)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per size; later runs reuse the saved takeoff")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report the Python peak per run")
+    parser.add_argument("--output", default=os.path.join("logs", "benchmarks", f"flows_{datetime.now().strftime('%Y-%m-%d_%H:%M:%S')}.json"))
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",")]
+    args.flows = args.flows.split(",")
+    args.modes = args.modes.split(",")
+
+    server = serve()
+    host, port = server.server_address[:2]
+    base_url = f"http://{host}:{port}"
+    with tempfile.TemporaryDirectory(prefix="aspire-bench-") as work_dir:
+        configure_environment(base_url, work_dir)
+        print(f"🧪 Mock Aspire on {base_url}")
+        started = time.perf_counter()
+        results = asyncio.run(run_benchmarks(args, base_url))
+    server.shutdown()
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({"sizes": args.sizes, "modes": args.modes, "seconds": time.perf_counter() - started,
+                   "results": results}, f, indent=2)
+    print(f"✅ Benchmark results saved to {args.output}")
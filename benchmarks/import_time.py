@@ -0,0 +1,55 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Measures how long a fresh interpreter takes to import each entry module, and
+# which heavy dependencies that import drags in. Run from the repository root:
+#   python benchmarks/import_time.py --repeat 10
+
+MODULES = ["cli", "property_destination", "estimation_destination", "property_runner", "worker"]
+HEAVY = ["pandas", "httpx", "browser_use", "playwright", "langchain_openai", "portkey_ai"]
+
+PROBE = """
+import sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(f"{{elapsed * 1000:.1f}} {{','.join(heavy)}}")
+"""
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module, repeat):
+    samples = []
+    heavy = ""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+            cwd=repo_root, capture_output=True, text=True, check=True,
+        ).stdout.split()
+        samples.append({"import_ms": float(output[0]), "process_ms": (time.perf_counter() - started) * 1000})
+        heavy = output[1] if len(output) > 1 else ""
+    return {
+        "module": module,
+        "import_ms": statistics.median(s["import_ms"] for s in samples),
+        "process_ms": statistics.median(s["process_ms"] for s in samples),
+        "heavy": heavy or "-",
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark import time of the entry modules.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    args = parser.parse_args()
+
+    print(f"{'module':<24} {'import ms':>10} {'process ms':>11}  heavy deps loaded")
+    for module in args.modules:
+        result = measure(module, args.repeat)
+        print(f"{result['module']:<24} {result['import_ms']:>10.1f} {result['process_ms']:>11.1f}  {result['heavy']}")
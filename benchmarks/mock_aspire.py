@@ -0,0 +1,321 @@
+import argparse
+import json
+import re
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Local stand-in for the parts of Aspire the flows touch. The pages are laid out so
+# browser-use assigns the same highlight indexes the scripted actions click on the
+# real app: login inputs 1-4 and the button 6, the property ellipsis 21, the
+# "Takeoff" menu item 77 and the takeoff panel collapse button 4.
+
+SESSION_COOKIE = "mock_aspire_session"
+
+PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+  body {{ font: 12px sans-serif; margin: 0; }}
+  nav a, .links a {{ margin: 2px 4px; display: inline-block; }}
+  .links {{ display: grid; grid-template-columns: repeat(11, auto); width: 900px; }}
+  .menu {{ position: absolute; top: 40px; left: 300px; background: #fff; border: 1px solid #999; display: none; }}
+  .menu button {{ display: block; width: 160px; }}
+  .hidden {{ display: none; }}
+  .p-treetable-toggler {{ width: 14px; height: 14px; border: 0; background: none; }}
+  td {{ padding: 1px 6px; }}
+  input.e-numerictextbox {{ width: 90px; }}
+</style></head>
+<body>{body}<script>{script}</script></body></html>
+"""
+
+LOGIN_BODY = """
+<a href="#">Aspire</a>
+<form id="login">
+  <input name="email" placeholder="Email">
+  <input name="password" type="password" placeholder="Password">
+  <input name="pin" placeholder="PIN">
+  <input name="device" placeholder="Device name">
+  <label><input type="checkbox" name="remember"> Remember me</label>
+  <button type="submit">Log in</button>
+</form>
+"""
+
+LOGIN_SCRIPT = """
+document.getElementById('login').addEventListener('submit', async (event) => {
+    event.preventDefault();
+    const form = new FormData(event.target);
+    const response = await fetch('/api/login', { method: 'POST', body: JSON.stringify(Object.fromEntries(form)) });
+    const session = await response.json();
+    localStorage.setItem('aspire_token', session.token);
+    location.href = '/';
+});
+"""
+
+PROPERTY_BODY = """
+<div id="property">
+  <nav>{nav}</nav>
+  <button class="ellipsis" id="ellipsis">&#8943;</button>
+  <div class="links">{links}</div>
+</div>
+<div id="takeoff" class="hidden">
+  <button>Back</button><button>Export</button><button>Print</button><button>Expand all</button>
+  <button id="collapse">Collapse panel</button>
+  <div id="panel">Takeoff notes</div>
+  <table><tbody id="rows"></tbody></table>
+  <button class="p-button-success" id="save" disabled>Save</button>
+</div>
+<div class="menu" id="menu"><button id="open-takeoff">Takeoff</button><button>Edit</button><button>Delete</button></div>
+"""
+
+PROPERTY_SCRIPT = """
+const propertyId = location.pathname.split('/').pop();
+let recalcTimer = null;
+
+document.getElementById('ellipsis').addEventListener('click', () => {
+    document.getElementById('menu').style.display = 'block';
+});
+document.getElementById('collapse').addEventListener('click', () => {
+    document.getElementById('panel').classList.toggle('hidden');
+});
+
+// Stand-in for the Syncfusion numeric textbox: the model only updates on change/blur
+function numericInput(item) {
+    const input = document.createElement('input');
+    input.className = 'e-control e-numerictextbox';
+    input.value = item.Quantity == null ? '' : Number(item.Quantity).toFixed(2);
+    const commit = () => {
+        const value = parseFloat(input.value.replace(/,/g, ''));
+        if (!Number.isNaN(value) && value !== item.Quantity) {
+            item.Quantity = value;
+            document.getElementById('save').disabled = false;
+            clearTimeout(recalcTimer);
+            recalcTimer = setTimeout(() => fetch(`/api/takeoff/${propertyId}/recalculate`, { method: 'POST' }), 300);
+        }
+    };
+    input.addEventListener('change', commit);
+    input.addEventListener('blur', commit);
+    return input;
+}
+
+function row(name, margin, uom, input) {
+    const tr = document.createElement('tr');
+    tr.className = 'ng-star-inserted';
+    const first = document.createElement('td');
+    const toggler = document.createElement('button');
+    toggler.className = 'p-treetable-toggler';
+    toggler.style.marginLeft = margin;
+    if (input) toggler.style.visibility = 'hidden';
+    first.append(toggler, name);
+    const second = document.createElement('td');
+    second.textContent = uom;
+    const third = document.createElement('td');
+    if (input) third.append(input);
+    tr.append(first, second, third);
+    return tr;
+}
+
+let takeoff = null;
+document.getElementById('open-takeoff').addEventListener('click', async () => {
+    document.getElementById('menu').style.display = 'none';
+    takeoff = await (await fetch(`/api/takeoff/${propertyId}`)).json();
+    const body = document.getElementById('rows');
+    const fragment = document.createDocumentFragment();
+    for (const serviceType of takeoff.ServiceTypes) {
+        fragment.append(row(serviceType.Name, '0px', '', null));
+        for (const item of serviceType.Items) {
+            fragment.append(row(item.ServiceItemTypeName, '16px', item.Measurement, numericInput(item)));
+        }
+    }
+    body.replaceChildren(fragment);
+    document.getElementById('property').classList.add('hidden');
+    document.getElementById('takeoff').classList.remove('hidden');
+});
+
+document.getElementById('save').addEventListener('click', async () => {
+    const save = document.getElementById('save');
+    save.disabled = true;
+    await fetch(`/api/takeoff/${propertyId}`, {
+        method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(takeoff),
+    });
+});
+"""
+
+ESTIMATION_BODY = """
+<nav><a href="#">Estimates</a><a href="#">Opportunities</a></nav>
+<h3>Estimation</h3>
+<button class="ellipsis" id="ellipsis">&#8943;</button>
+<div class="menu" id="menu"><button id="import-option">Import</button><button>Copy</button></div>
+<div id="dialog" class="hidden">
+  <input type="file" id="file" style="display: none">
+  <button id="import">Import</button>
+  <span id="status"></span>
+</div>
+"""
+
+ESTIMATION_SCRIPT = """
+const estimationId = location.pathname.split('/').pop();
+document.getElementById('ellipsis').addEventListener('click', () => {
+    document.getElementById('menu').style.display = 'block';
+});
+document.getElementById('import-option').addEventListener('click', () => {
+    document.getElementById('menu').style.display = 'none';
+    document.getElementById('dialog').classList.remove('hidden');
+});
+document.getElementById('import').addEventListener('click', async () => {
+    const file = document.getElementById('file').files[0];
+    if (!file) return;
+    const response = await fetch(`/api/estimation/${estimationId}/import`, { method: 'POST', body: file });
+    document.getElementById('status').textContent = response.ok ? 'Imported' : 'Import failed';
+});
+"""
+
+
+def build_takeoff(rows, items_per_type=10):
+    service_types = []
+    for i in range(rows):
+        if i % items_per_type == 0:
+            service_types.append({"Name": f"Service Type {len(service_types) + 1:04d}", "Items": []})
+        service_types[-1]["Items"].append({
+            "ServiceItemTypeName": f"Service Item {i + 1:05d}",
+            "Measurement": "SF",
+            "Quantity": 0,
+        })
+    return {"ServiceTypes": service_types}
+
+
+class MockAspireState:
+
+    def __init__(self, rows):
+        self.lock = threading.Lock()
+        self.rows = rows
+        self.sessions = set()
+        self.takeoffs = {}
+        self.saves = []
+        self.recalculations = 0
+        self.imports = []
+
+    def rows_for(self, property_id):
+        # "rows-1000" style ids pick their own size, so one server covers every benchmark size
+        match = re.search(r"rows-(\d+)", property_id)
+        return int(match[1]) if match else self.rows
+
+    def takeoff(self, property_id):
+        with self.lock:
+            if property_id not in self.takeoffs:
+                self.takeoffs[property_id] = build_takeoff(self.rows_for(property_id))
+            return self.takeoffs[property_id]
+
+    def saved_values(self, property_id):
+        # serviceItemType -> saved quantity, from the last Save of the property
+        document = self.takeoffs.get(property_id, {"ServiceTypes": []})
+        return {item["ServiceItemTypeName"]: item["Quantity"]
+                for service_type in document["ServiceTypes"] for item in service_type["Items"]}
+
+
+def make_handler(state):
+
+    class MockAspireHandler(BaseHTTPRequestHandler):
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body, content_type="application/json", headers=None):
+            data = body if isinstance(body, bytes) else body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _json(self, document, status=200, headers=None):
+            self._send(status, json.dumps(document), headers=headers)
+
+        def _page(self, title, body, script):
+            self._send(200, PAGE.format(title=title, body=body, script=script), "text/html; charset=utf-8")
+
+        def _logged_in(self):
+            cookies = dict(part.strip().split("=", 1) for part in self.headers.get("Cookie", "").split(";") if "=" in part)
+            return cookies.get(SESSION_COOKIE) in state.sessions
+
+        def _body(self):
+            return self.rfile.read(int(self.headers.get("Content-Length", 0) or 0))
+
+        def do_GET(self):
+            path = urlsplit(self.path).path
+            if path == "/login":
+                return self._page("Login", LOGIN_BODY, LOGIN_SCRIPT)
+            if not self._logged_in():
+                # Expired or missing session: back to the login page, like Aspire
+                self.send_response(302)
+                self.send_header("Location", "/login")
+                self.end_headers()
+                return
+
+            if path == "/":
+                return self._page("Home", "<h3>Aspire home</h3>", "")
+            if match := re.fullmatch(r"/property/([\w-]+)", path):
+                nav = "".join(f'<a href="#">Nav {i}</a>' for i in range(21))
+                links = "".join(f'<a href="#">Detail {i}</a>' for i in range(55))
+                return self._page(f"Property {match[1]}", PROPERTY_BODY.format(nav=nav, links=links), PROPERTY_SCRIPT)
+            if re.fullmatch(r"/estimation/[\w-]+", path):
+                return self._page("Estimation", ESTIMATION_BODY, ESTIMATION_SCRIPT)
+            if match := re.fullmatch(r"/api/takeoff/([\w-]+)", path):
+                return self._json(state.takeoff(match[1]))
+            if path == "/api/state":
+                property_id = parse_qs(urlsplit(self.path).query).get("property_id", [""])[0]
+                return self._json({"saves": len(state.saves), "recalculations": state.recalculations,
+                                   "imports": state.imports, "values": state.saved_values(property_id)})
+            self._json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            path = urlsplit(self.path).path
+            body = self._body()
+            if path == "/api/login":
+                token = uuid.uuid4().hex
+                state.sessions.add(token)
+                return self._json({"token": token}, headers={"Set-Cookie": f"{SESSION_COOKIE}={token}; Path=/; HttpOnly"})
+            if not self._logged_in():
+                return self._json({"error": "unauthorized"}, 401)
+
+            if match := re.fullmatch(r"/api/takeoff/([\w-]+)/recalculate", path):
+                state.recalculations += 1
+                return self._json({"ok": True})
+            if match := re.fullmatch(r"/api/takeoff/([\w-]+)", path):
+                document = json.loads(body)
+                with state.lock:
+                    state.takeoffs[match[1]] = document
+                    state.saves.append(match[1])
+                return self._json(document)
+            if match := re.fullmatch(r"/api/estimation/([\w-]+)/import", path):
+                state.imports.append({"estimation_id": match[1], "bytes": len(body)})
+                return self._json({"ok": True, "bytes": len(body)})
+            self._json({"error": "not found"}, 404)
+
+    return MockAspireHandler
+
+
+def serve(rows=100, host="127.0.0.1", port=0):
+    # Returns a started server; port 0 picks a free port (server.server_address)
+    state = MockAspireState(rows)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.state = state
+    threading.Thread(target=server.serve_forever, name="mock-aspire", daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve a local mock of the Aspire pages the flows automate.")
+    parser.add_argument("--rows", type=int, default=100, help="Takeoff rows for property ids without a rows-N size")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    server = serve(args.rows, args.host, args.port)
+    print(f"🧪 Mock Aspire on http://{args.host}:{args.port}/login ({args.rows} takeoff rows)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import os
+import random
+import re
+import time
+
+from dotenv import load_dotenv
+
+from tracing import tracer
+
+load_dotenv()
+
+
+class TakeoffCheckpoint:
+
+    # Append-only journal of the takeoff rows written to and saved in one property.
+    # A run that crashes leaves it behind and the next run skips the rows already
+    # saved with the same value; a finished run deletes it. Lines look like
+    # {"event": "saved", "at": 1700000000.0, "items": {"Mow with Rider - Warm Season": "900"}}
+    def __init__(self, property_id, folder=None, max_age_hours=None):
+        folder = folder or os.getenv('ASPIRE_CHECKPOINT_DIR', os.path.join(".cache", "checkpoints"))
+        safe_id = re.sub(r"[^\w-]", "_", str(property_id))
+        self.path = os.path.join(folder, f"takeoff_{safe_id}.jsonl")
+        self.max_age_seconds = float(max_age_hours or os.getenv('ASPIRE_CHECKPOINT_MAX_AGE_HOURS', 24)) * 60 * 60
+
+    def load(self):
+        # Returns {"written": {name: value}, "saved": {name: value}} from the journal
+        state = {"written": {}, "saved": {}}
+        if not os.path.exists(self.path):
+            return state
+        if time.time() - os.path.getmtime(self.path) > self.max_age_seconds:
+            print(f"⌛ Ignoring stale checkpoint {self.path}")
+            self.finish()
+            return state
+
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Last line cut short by the crash
+                    continue
+                state.setdefault(entry["event"], {}).update(entry["items"])
+        return state
+
+    def pending(self, df):
+        # Returns (rows of df still to do, names already saved with the same value)
+        from takeoff import takeoff_items
+
+        state = self.load()
+        saved = state["saved"]
+        unsaved = [name for name, value in state["written"].items() if saved.get(name) != value]
+        if unsaved:
+            print(f"↩️ {len(unsaved)} takeoff items were written but not saved before the last run stopped")
+
+        items = takeoff_items(df)
+        done = [saved.get(item["name"]) == item["value"] for item in items]
+        skipped = [item["name"] for item, is_done in zip(items, done) if is_done]
+        return df[[not is_done for is_done in done]], skipped
+
+    def record(self, event, items):
+        # event: "written" or "saved"; items: {name: value}
+        if not items:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"event": event, "at": time.time(), "items": items}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def finish(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def backoff_delay(attempt, base_delay, max_delay=60.0):
+    # Exponential backoff with jitter: ~base, ~2*base, ~4*base ... capped at max_delay
+    return min(max_delay, base_delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+
+async def retry_with_backoff(fn, attempts, base_delay, label="Attempt"):
+    # fn(attempt_number) is awaited until it returns; the last failure is re-raised
+    for attempt in range(1, attempts + 1):
+        try:
+            return await fn(attempt)
+        except Exception as e:
+            if attempt == attempts:
+                raise
+            delay = backoff_delay(attempt, base_delay)
+            print(f"⚠️ {label} failed (attempt {attempt}/{attempts}): {e}. Retrying in {delay:.1f}s")
+            tracer.count("retries")
+            await asyncio.sleep(delay)
@@ -0,0 +1,30 @@
+import argparse
+import importlib
+
+# Subcommand -> (module, help). A module is imported only when its command runs,
+# so "--help" and every command start without loading the others.
+COMMANDS = {
+    "property": ("property_destination", "Fill the Takeoff of one property (ASPIRE_PROPERTY_ID)"),
+    "estimation": ("estimation_destination", "Import the estimation workbook (ASPIRE_ESTIMATION_ID)"),
+    "runner": ("property_runner", "Fill takeoffs for many properties concurrently"),
+    "worker": ("worker", "Keep Chromium warm and consume jobs from a queue"),
+    "reconcile": ("reconciliation", "Reconcile a takeoff CSV against extracted service items"),
+    "api": ("aspire_api", "Push takeoff values straight to the Aspire API"),
+    "api-stub": ("aspire_api_stub", "Serve recorded Aspire API responses locally"),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="cli.py", description="Aspire browser automation.")
+    subparsers = parser.add_subparsers(dest="command", required=True, metavar="command")
+    for name, (_, help) in COMMANDS.items():
+        # The command's own parser handles its options, including --help
+        subparsers.add_parser(name, help=help, add_help=False)
+
+    args, rest = parser.parse_known_args(argv)
+    module = importlib.import_module(COMMANDS[args.command][0])
+    module.cli(rest, prog=f"cli.py {args.command}")
+
+
+if __name__ == '__main__':
+    main()
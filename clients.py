@@ -0,0 +1,112 @@
+import functools
+import os
+
+from dotenv import load_dotenv
+
+from readiness import attach as attach_readiness
+from resource_routing import ResourceRouter
+
+# Load environment variables
+load_dotenv()
+
+# Clients shared by the flows. Each one is built on first use, so importing a flow
+# module stays cheap and does not pull in browser_use, langchain or playwright.
+
+# Define a realistic and modern user-agent
+realistic_user_agent = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/135.0.0.0 Safari/537.36"
+)
+
+stealth_headers = {
+    "sec-ch-ua": '"Google Chrome";v="135", "Not-A.Brand";v="8", "Chromium";v="135"',
+    "sec-ch-ua-mobile": "?0",
+    "sec-ch-ua-platform": '"macOS"',
+}
+
+stealth_script = """
+    // Hide webdriver
+    Object.defineProperty(navigator, 'webdriver', { get: () => false });
+
+    // Spoof browser environment
+    window.chrome = { runtime: {} };
+    Object.defineProperty(navigator, 'plugins', { get: () => [1, 2, 3] });
+    Object.defineProperty(navigator, 'languages', { get: () => ['en-US', 'en'] });
+"""
+
+
+@functools.cache
+def get_llm():
+    from langchain_openai import ChatOpenAI
+    from portkey_ai import createHeaders, PORTKEY_GATEWAY_URL
+
+    # Load Portkey headers for LLM
+    portkey_headers = createHeaders(
+        api_key=os.getenv('PORT_KEY_API'),
+        virtual_key=os.getenv('PORT_KEY_VIRTUAL_KEY')
+    )
+    return ChatOpenAI(
+        model=os.getenv('OPENAI_LLM_MODEL'),
+        api_key="",
+        base_url=PORTKEY_GATEWAY_URL,
+        default_headers=portkey_headers
+    )
+
+
+@functools.cache
+def get_browser():
+    from browser_use import Browser, BrowserConfig
+
+    # Configure browser with stealth options
+    config = BrowserConfig(
+        headless=True,  # Run in headless mode (can be False for debugging)
+        disable_security=True,
+        extra_chromium_args=[
+            "--disable-blink-features=AutomationControlled", # Removes navigator.webdriver = true
+        ]
+    )
+    return Browser(config)
+
+
+def new_browser_context(browser=None):
+    from browser_use import BrowserContextConfig
+    from browser_use.agent.service import BrowserContext
+
+    # Context configuration to spoof headers
+    context_config = BrowserContextConfig(
+        user_agent=realistic_user_agent,
+    )
+    if os.getenv('ASPIRE_DOM_COMPACTION', 'on') != 'off':
+        # Agent prompts get the page without hidden subtrees and long runs of table rows
+        from dom_compaction import CompactBrowserContext
+        return CompactBrowserContext(browser=browser or get_browser(), config=context_config)
+    return BrowserContext(browser=browser or get_browser(), config=context_config)
+
+
+@functools.cache
+def get_slack():
+    from slack import Slack
+    return Slack()
+
+
+@functools.cache
+def get_resource_router():
+    # Blocks images/fonts/trackers and serves JS/CSS bundles from a disk cache
+    return ResourceRouter()
+
+
+async def prepare_page(browser_context, network_trace):
+    page = await browser_context.get_current_page()
+    await get_resource_router().attach(browser_context.session.context)
+
+    # Patch headers right after page is created
+    await page.set_extra_http_headers(stealth_headers)
+
+    # Attach stealth anti-detection patches
+    await page.add_init_script(stealth_script)
+
+    # Attach logging and readiness tracking before any actions
+    network_trace.attach(page)
+    attach_readiness(page)
+    return page
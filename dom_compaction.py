@@ -0,0 +1,106 @@
+import os
+from dataclasses import replace
+
+from browser_use.browser.context import BrowserContext
+from browser_use.dom.views import DOMElementNode, DOMTextNode
+from dotenv import load_dotenv
+
+from tracing import tracer
+
+load_dotenv()
+
+# Subtrees that never carry anything the agent can act on or needs to read
+PRUNED_TAGS = {"svg", "path", "script", "style", "noscript", "template"}
+
+
+def _row_signature(node):
+    # Rows of the same table/list render alike: same tag, classes and cell layout
+    return (node.tag_name, node.attributes.get("class", ""),
+            tuple(child.tag_name for child in node.children if isinstance(child, DOMElementNode)))
+
+
+def _is_irrelevant(node):
+    return (node.tag_name in PRUNED_TAGS or node.attributes.get("aria-hidden") == "true"
+            or not node.is_visible)
+
+
+def _omitted_rows(parent, count, tag):
+    return DOMTextNode(is_visible=True, parent=parent, text=f"... {count} more similar <{tag}> rows omitted")
+
+
+def _has_highlight(node):
+    return node.highlight_index is not None or any(
+        _has_highlight(child) for child in node.children if isinstance(child, DOMElementNode))
+
+
+def _compact(node, parent, keep_rows, dedupe_tags, stats):
+    # Returns (compacted copy of node under parent, whether the subtree still holds
+    # an element with a highlight index). The original node is not touched.
+    copy = replace(node, parent=parent, children=[])
+    has_highlight = node.highlight_index is not None
+    run_signature, run_length, omitted = None, 0, 0
+    for child in node.children:
+        if not isinstance(child, DOMElementNode):
+            copy.children.append(replace(child, parent=copy))
+            continue
+
+        is_row = child.tag_name in dedupe_tags or child.attributes.get("role") == "row"
+        signature = _row_signature(child) if is_row else None
+        if signature is not None and signature == run_signature:
+            run_length += 1
+            if run_length > keep_rows:
+                # A row the agent can act on stays, or it could never pick that row
+                if not _has_highlight(child):
+                    omitted += 1
+                    continue
+                if omitted:
+                    copy.children.append(_omitted_rows(copy, omitted, run_signature[0]))
+                    stats["rows_deduplicated"] += omitted
+                    omitted = 0
+        else:
+            if omitted:
+                copy.children.append(_omitted_rows(copy, omitted, run_signature[0]))
+                stats["rows_deduplicated"] += omitted
+            run_signature, run_length, omitted = signature, 1, 0
+
+        child_copy, child_has_highlight = _compact(child, copy, keep_rows, dedupe_tags, stats)
+        if not child_has_highlight and _is_irrelevant(child):
+            stats["subtrees_pruned"] += 1
+            continue
+        has_highlight = has_highlight or child_has_highlight
+        copy.children.append(child_copy)
+
+    if omitted:
+        copy.children.append(_omitted_rows(copy, omitted, run_signature[0]))
+        stats["rows_deduplicated"] += omitted
+    return copy, has_highlight
+
+
+def compact_dom_tree(root, keep_rows=3, dedupe_tags=("tr",)):
+    # Returns (compacted copy of the element tree, stats) for the agent prompt:
+    # hidden, decorative and aria-hidden subtrees without interactive elements are
+    # dropped, and long runs of look-alike rows keep only their first keep_rows plus
+    # any later row holding an interactive (highlighted) element.
+    # root itself is left whole, so lookups by xpath/branch (trajectory replay)
+    # and the selector map still see every element.
+    stats = {"subtrees_pruned": 0, "rows_deduplicated": 0}
+    compacted, _ = _compact(root, root.parent, keep_rows, set(dedupe_tags), stats)
+    return compacted, stats
+
+
+class CompactBrowserContext(BrowserContext):
+
+    # BrowserContext whose state (and so every agent prompt) carries the compacted tree;
+    # the full tree stays on state.full_element_tree
+    def __init__(self, *args, keep_rows=None, dedupe_tags=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.keep_rows = keep_rows or int(os.getenv('ASPIRE_DOM_KEEP_ROWS', 3))
+        self.dedupe_tags = dedupe_tags or os.getenv('ASPIRE_DOM_DEDUPE_TAGS', 'tr').split(",")
+
+    async def _update_state(self, focus_element: int = -1):
+        state = await super()._update_state(focus_element)
+        state.full_element_tree = state.element_tree
+        state.element_tree, stats = compact_dom_tree(state.element_tree, self.keep_rows, self.dedupe_tags)
+        tracer.count("dom_subtrees_pruned", stats["subtrees_pruned"])
+        tracer.count("dom_rows_deduplicated", stats["rows_deduplicated"])
+        return state
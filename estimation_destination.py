@@ -1,44 +1,34 @@
+import argparse
 import asyncio
+import functools
 import os
+import time
 from datetime import datetime
+from pathlib import Path
 
-import pandas as pd
 from dotenv import load_dotenv
-from pathlib import Path
-from playwright.async_api import async_playwright
 
-from browser_use import Agent, Browser, BrowserConfig, BrowserContextConfig, Controller
-from browser_use.agent.views import ActionResult
-from browser_use.agent.service import BrowserContext
-from langchain_openai import ChatOpenAI
-from portkey_ai import createHeaders, PORTKEY_GATEWAY_URL
-from slack import Slack
+import clients
+from clients import get_browser, get_llm, get_resource_router, get_slack, new_browser_context
+from estimation_workbook import UploadLedger, build_workbook, file_digest
+from network_trace import NetworkTraceWriter
+from readiness import attach as attach_readiness, register_readiness_actions
+from session_cache import SessionCache
+from tracing import tracer
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Slack instance
-s = Slack()
+# Cached login session shared across runs
+session_cache = SessionCache()
+
+# Content hash of the last workbook imported into each estimation
+upload_ledger = UploadLedger()
 
 # Timestamp and folder for logs
 timestamp = datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
 llm_conversation_folder_name = f"logs-{timestamp}"
 log_folder = os.path.join("logs", "api_logs", "estimation_destination")
-os.makedirs(log_folder, exist_ok=True)  # Ensure the directory exists
-log_file = os.path.join(log_folder, f"api_logs_{timestamp}.txt")
-
-# Load Portkey headers for LLM
-portkey_headers = createHeaders(
-    api_key=os.getenv('PORT_KEY_API'),
-    virtual_key=os.getenv('PORT_KEY_VIRTUAL_KEY')
-)
-
-llm = ChatOpenAI(
-    model=os.getenv('OPENAI_LLM_MODEL'),
-    api_key="",
-    base_url=PORTKEY_GATEWAY_URL,
-    default_headers=portkey_headers
-)
 
 # variables
 aspire_login_url = os.getenv('ASPIRE_LOGIN_URL')
@@ -48,169 +38,251 @@ aspire_login_pin = os.getenv('ASPIRE_LOGIN_PIN')
 aspire_login_device_name = os.getenv('ASPIRE_LOGIN_DEVICE_NAME')
 aspire_estimation_id = os.getenv('ASPIRE_ESTIMATION_ID')
 aspire_estimation_base_url = os.getenv('ASPIRE_ESTIMATION_BASE_URL')
-
-file_name = "aspire_upload_example.xlsx"
+aspire_agent_mode = os.getenv('ASPIRE_AGENT_MODE', 'scripted')  # "scripted" or "agent"
+aspire_estimation_source = os.getenv('ASPIRE_ESTIMATION_SOURCE')  # CSV to build the workbook from
+aspire_estimation_import_pattern = os.getenv('ASPIRE_ESTIMATION_IMPORT_PATTERN', 'import')  # regex of the import request URL
+aspire_import_timeout_seconds = float(os.getenv('ASPIRE_IMPORT_TIMEOUT_SECONDS', 30))
+
+# Values the fallback agent may type but must never see
+aspire_sensitive_data = {k: v for k, v in {
+    "aspire_login_email": aspire_login_email,
+    "aspire_login_password": aspire_login_password,
+    "aspire_login_pin": aspire_login_pin,
+}.items() if v}
+
+file_name = os.getenv('ASPIRE_ESTIMATION_FILE', "aspire_upload_example.xlsx")
 base_dir = Path(__file__).resolve().parent
 
-# Recursively find the file
-file_path = next(base_dir.rglob(file_name), None)
 
-available_file_paths = [str(file_path)]
+def find_upload_file():
+    # Next to this script first; the recursive search only when it is elsewhere
+    path = Path(file_name) if os.path.isabs(file_name) else base_dir / file_name
+    if path.exists():
+        return path
+    return next(base_dir.rglob(Path(file_name).name), None)
 
-# Configure browser with stealth options
-config = BrowserConfig(
-    headless=True,  # Run in headless mode (can be False for debugging)
-    disable_security=True,
-    extra_chromium_args=[
-        "--disable-blink-features=AutomationControlled", # Removes navigator.webdriver = true
-    ]
-)
 
-# Define a realistic and modern user-agent
-realistic_user_agent = (
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-    "AppleWebKit/537.36 (KHTML, like Gecko) "
-    "Chrome/135.0.0.0 Safari/537.36"
-)
+def prepare_estimation_file(estimation_id, source=None):
+    # Returns (workbook path, content hash). With a source the workbook is generated
+    # from it; otherwise the static example workbook is uploaded as before
+    if source is None:
+        path = find_upload_file()
+        if path is None:
+            raise FileNotFoundError(f"Estimation workbook {file_name} not found under {base_dir}; "
+                                    "set ASPIRE_ESTIMATION_FILE or ASPIRE_ESTIMATION_SOURCE")
+        return path, file_digest(path)
 
-# Context configuration to spoof headers
-context_config = BrowserContextConfig(
-    user_agent=realistic_user_agent,
-)
+    path = os.path.join("logs", "estimations", f"estimation_{estimation_id}_{timestamp}.xlsx")
+    digest, _ = build_workbook(source, path)
+    return path, digest
 
-browser = Browser(config)
-browser_context = BrowserContext(browser=browser, config=context_config)
 
-controller = Controller()
+# Buffered network trace of the Aspire API traffic; created on first use
+@functools.cache
+def get_network_trace():
+    return NetworkTraceWriter(log_folder, f"api_logs_{timestamp}")
 
-# Initial browser actions to log in and reach target page
-initial_actions_for_estimation_destination = [
+
+# Browser actions to log in to Aspire
+login_actions_for_estimation_destination = [
     {"go_to_url": {"url": "{aspire_login_url}".format(aspire_login_url=aspire_login_url)}},
-    {"wait": {"seconds": 10}},
+    {"wait_for_selector": {"selector": "input[type='password']", "timeout": 10}},
     {"input_text": {"index": 1, "text": "{aspire_login_email}".format(aspire_login_email=aspire_login_email)}},
     {"input_text": {"index": 2, "text": "{aspire_login_password}".format(aspire_login_password=aspire_login_password)}},
     {"input_text": {"index": 3, "text": "{aspire_login_pin}".format(aspire_login_pin=aspire_login_pin)}},
     {"input_text": {"index": 4, "text": "{aspire_login_device_name}".format(aspire_login_device_name=aspire_login_device_name)}},
     {"click_element": {"index": 6}},
-    {"wait": {"seconds": 10}},
-    {"go_to_url": {"url": "{aspire_estimation_base_url}/{aspire_estimation_id}".format(aspire_estimation_base_url=aspire_estimation_base_url, aspire_estimation_id=aspire_estimation_id)}},
-    {"wait": {"seconds": 20}},
+    {"wait_for_network_idle": {"timeout": 10}},
 ]
 
+def build_estimation_url(estimation_id):
+    return "{aspire_estimation_base_url}/{estimation_id}".format(aspire_estimation_base_url=aspire_estimation_base_url, estimation_id=estimation_id)
 
-@controller.action('Upload file directly via selector')
-async def upload_file_directly(selector: str, path: str, browser: BrowserContext, available_file_paths: list[str]):
-    if path not in available_file_paths:
-        return ActionResult(error=f'File path {path} is not in available_file_paths')
-    if not os.path.exists(path):
-        return ActionResult(error=f'File {path} does not exist')
-
-    page = await browser.get_current_page()
+# Browser actions to open the estimation page
+def build_open_estimation_actions(estimation_id):
+    return [
+        {"go_to_url": {"url": build_estimation_url(estimation_id)}},
+        {"wait_for_network_idle": {"timeout": 20}},
+    ]
 
-    try:
-        file_input = page.locator(selector).first
-        await file_input.wait_for(state="attached", timeout=5000)
-        await file_input.evaluate("el => { el.style.display = 'block'; el.style.visibility = 'visible'; }")
-        await file_input.set_input_files(path)
+# Initial browser actions to log in and reach target page
+initial_actions_for_estimation_destination = login_actions_for_estimation_destination + build_open_estimation_actions(aspire_estimation_id)
+
+
+# Import steps for the agent; a successful run is recorded and replayed without the LLM
+estimation_import_task = """
+    1. Click on the first ellipsis button and wait for the network to be idle (timeout 3 seconds).
+    2. Select the Import option and wait until selector 'input[type="file"]' is attached (timeout 3 seconds).
+    3. Use selector 'input[type="file"]' to upload the file.
+    4. Click on the Import button and wait for the network to be idle (timeout 10 seconds).
+"""
+
+
+@functools.cache
+def get_trajectory_cache():
+    from trajectory_cache import TrajectoryCache
+    return TrajectoryCache("estimation_import", estimation_import_task)
+
+
+# Controller with readiness waits and the direct file upload action
+@functools.cache
+def get_controller():
+    from browser_use import Controller
+    from browser_use.agent.views import ActionResult
+    from browser_use.agent.service import BrowserContext
+
+    controller = register_readiness_actions(Controller())
+
+    @controller.action('Upload file directly via selector')
+    async def upload_file_directly(selector: str, path: str, browser: BrowserContext, available_file_paths: list[str]):
+        if path not in available_file_paths:
+            return ActionResult(error=f'File path {path} is not in available_file_paths')
+        if not os.path.exists(path):
+            return ActionResult(error=f'File {path} does not exist')
+
+        page = await browser.get_current_page()
+
+        try:
+            with tracer.span("estimation.upload_file_directly", selector=selector):
+                file_input = page.locator(selector).first
+                await file_input.wait_for(state="attached", timeout=5000)
+                await file_input.evaluate("el => { el.style.display = 'block'; el.style.visibility = 'visible'; }")
+                await file_input.set_input_files(path)
+
+            msg = f"✅ Successfully uploaded file using selector '{selector}'"
+            return ActionResult(extracted_content=msg, include_in_memory=True)
+
+        except Exception as e:
+            msg = f"❌ Failed to upload file with selector '{selector}': {str(e)}"
+            return ActionResult(error=msg)
+
+    return controller
+
+
+async def prepare_page(browser_context):
+    return await clients.prepare_page(browser_context, get_network_trace())
+
+
+async def wait_for_import_response(readiness, marker, timeout=None):
+    # The upload request (POST/PUT matching the import pattern) sent after marker, or None
+    deadline = time.monotonic() + (timeout or aspire_import_timeout_seconds)
+    while (remaining := deadline - time.monotonic()) > 0:
+        response = await readiness.wait_for_response(aspire_estimation_import_pattern, timeout=remaining, since=marker)
+        if response is None:
+            return None
+        if response.request.method in ("POST", "PUT"):
+            return response
+    return None
+
+
+async def upload_estimation(browser, browser_context, page, estimation_id, file_path, session_cache=session_cache, restore=True, digest=None):
+    from llm_cache import CachedAgent
+    from scripted_actions import ScriptedExecutor, fallback_task
+    from trajectory_cache import run_with_trajectory_cache
+
+    controller = get_controller()
+    task = estimation_import_task
+    available_file_paths = [str(file_path)]
+
+    # Reuse the cached login when it is still valid; the page is then already open.
+    # A context that is already logged in (restore=False) only needs the same check
+    initial_actions = login_actions_for_estimation_destination + build_open_estimation_actions(estimation_id)
+    with tracer.span("session.restore"):
+        restored = await session_cache.restore(browser_context) if restore else True
+        if restored and await session_cache.is_valid(page, build_estimation_url(estimation_id)):
+            initial_actions = None
+
+    # Log in and open the page without the LLM; on failure the agent gets the remaining steps first
+    if initial_actions and aspire_agent_mode != "agent":
+        executor = ScriptedExecutor(controller, browser_context, sensitive_data=aspire_sensitive_data)
+        failed_at, results = await executor.run(initial_actions)
+        if failed_at is not None:
+            task = fallback_task(
+                "Log in to Aspire and open the estimation page, then do the numbered import steps.",
+                initial_actions, failed_at, results, aspire_sensitive_data,
+            ) + "\nImport steps:" + task
+        initial_actions = None
+
+    def make_agent(task):
+        return CachedAgent(
+            task=task,
+            llm=get_llm(),
+            controller=controller,
+            browser=browser,
+            save_conversation_path=f"logs/llm_coversation/estimation_destination/{llm_conversation_folder_name}/{estimation_id}/conversation",
+            browser_context=browser_context,
+            available_file_paths=available_file_paths,
+            sensitive_data=aspire_sensitive_data,
+            initial_actions=initial_actions,
+        )
+
+    # The import only counts once Aspire has accepted the upload request made from here on
+    readiness = attach_readiness(await browser_context.get_current_page())
+    marker = readiness.mark()
+
+    if initial_actions is None and task == estimation_import_task:
+        # Replay the recorded import; the LLM only runs from the step where the page diverges
+        history = await run_with_trajectory_cache(
+            get_trajectory_cache(), task, make_agent, controller, browser_context,
+            available_file_paths=available_file_paths, sensitive_data=aspire_sensitive_data,
+        )
+    else:
+        with tracer.span("agent.run"):
+            history = await make_agent(task).run()
+    tracer.record_agent_history(history)
+    await session_cache.save(browser_context)
+
+    # A full replay has no history; an agent run counts only if it finished
+    uploaded = history is None or (history.is_done() and history.is_successful() is not False)
+    if uploaded:
+        response = await wait_for_import_response(readiness, marker)
+        if response is None:
+            print(f"❌ Estimation {estimation_id}: no import request reached Aspire")
+            uploaded = False
+        elif not response.ok:
+            print(f"❌ Estimation {estimation_id}: Aspire rejected the import [{response.status}]")
+            uploaded = False
+    if uploaded and digest:
+        upload_ledger.record(estimation_id, digest, file_path)
+    return uploaded
 
-        msg = f"✅ Successfully uploaded file using selector '{selector}'"
-        return ActionResult(extracted_content=msg, include_in_memory=True)
 
-    except Exception as e:
-        msg = f"❌ Failed to upload file with selector '{selector}': {str(e)}"
-        return ActionResult(error=msg)
-
-# === Logging Functions ===
-async def log_request_headers(request):
-    try:
-        with open(log_file, "a") as f:
-            f.write(f"\n🔹 [API] {request.method} {request.url}\n")
-            f.write("Headers:\n")
-            for k, v in request.headers.items():
-                f.write(f"  {k}: {v}\n")
-            if request.method in ["POST", "PUT", "PATCH", "GET"]:
-                try:
-                    post_data = request.post_data
-                    if post_data:
-                        f.write("\nBody:\n")
-                        f.write(f"{post_data}\n")
-                except Exception as e:
-                    f.write(f"\n⚠️ Failed to get request body: {e}\n")
-    except Exception as e:
-        print(f"⚠️ Request log error: {e}")
+async def estimation_destination():
+    from playwright.async_api import async_playwright
 
-async def log_response_headers(response):
+    tracer.name = "estimation_destination"
+    s = get_slack()
+    s.sendMessageToChannel("Preparing the excel file for estimation destination.")
     try:
-        headers = await response.all_headers()
-        content_type = headers.get("content-type", "")
-        status = response.status
-        url = response.url
-
-        with open(log_file, "a") as f:
-            f.write(f"\nResponse [{status}] for {url}\n")
-            f.write("Headers:\n")
-            for k, v in headers.items():
-                f.write(f"  {k}: {v}\n")
-            if "application/json" in content_type:
-                try:
-                    body = await response.body()
-                    decoded = body.decode("utf-8", errors="ignore")
-                    f.write("\nResponse Body:\n")
-                    f.write(f"{decoded}\n")
-                except Exception as e:
-                    f.write(f"\n⚠️ Failed to decode JSON body: {e}\n")
+        with tracer.span("estimation.prepare_file"):
+            file_path, digest = prepare_estimation_file(aspire_estimation_id, aspire_estimation_source)
     except Exception as e:
-        print(f"⚠️ Response log error: {e}")
-
-async def estimation_destination():
+        print(f"❌ Could not prepare the estimation file: {e}")
+        s.sendMessageToChannel(f"❌ Could not prepare the estimation file: {e}")
+        await s.aclose()
+        tracer.export()
+        return
+    if upload_ledger.is_uploaded(aspire_estimation_id, digest):
+        # Same rows as the last import into this estimation; skip the browser entirely
+        print(f"✅ Estimation {aspire_estimation_id} is unchanged since its last upload, skipping")
+        s.sendMessageToChannel("Estimation is unchanged since the last upload, skipped.")
+        await s.aclose()
+        tracer.export()
+        return
+
+    browser = get_browser()
+    browser_context = new_browser_context(browser)
     try:
         async with async_playwright():
 
-            page = await browser_context.get_current_page()
-
-            # Patch headers right after page is created
-            await page.set_extra_http_headers({
-                "sec-ch-ua": '"Google Chrome";v="135", "Not-A.Brand";v="8", "Chromium";v="135"',
-                "sec-ch-ua-mobile": "?0",
-                "sec-ch-ua-platform": '"macOS"',
-            })
-
-            # Attach stealth anti-detection patches
-            await page.add_init_script("""
-                // Hide webdriver
-                Object.defineProperty(navigator, 'webdriver', { get: () => false });
-
-                // Spoof browser environment
-                window.chrome = { runtime: {} };
-                Object.defineProperty(navigator, 'plugins', { get: () => [1, 2, 3] });
-                Object.defineProperty(navigator, 'languages', { get: () => ['en-US', 'en'] });
-            """)
-
-            # Attach logging before any actions
-            page.on("request", lambda request: asyncio.create_task(log_request_headers(request)))
-            page.on("response", lambda response: asyncio.create_task(log_response_headers(response)))
-
-            task = """
-                1. Click on the first ellipsis button and wait for 3 seconds.
-                2. Select the Import option and wait for 3 seconds.
-                3. Use selector 'input[type="file"]' to upload the file.
-                4. Click on the Import button and wait for 10 seconds.
-            """
-
-            agent = Agent(
-                task=task,
-                llm=llm,
-                controller=controller,
-                browser=browser,
-                save_conversation_path=f"logs/llm_coversation/estimation_destination/{llm_conversation_folder_name}/conversation",
-                browser_context=browser_context,
-                available_file_paths=available_file_paths,
-                initial_actions=initial_actions_for_estimation_destination,
-            )
-
-            s.sendMessageToChannel("Preparing the excel file for estimation destination.")
-            await agent.run()
-            s.sendMessageToChannel("File has been uploaded successfully.")
+            page = await prepare_page(browser_context)
+
+            with tracer.span("estimation.upload", estimation_id=aspire_estimation_id):
+                uploaded = await upload_estimation(browser, browser_context, page, aspire_estimation_id, file_path, digest=digest)
+            if uploaded:
+                s.sendMessageToChannel("File has been uploaded successfully.")
+            else:
+                s.sendMessageToChannel("❌ The agent could not finish the estimation import.")
     
     except Exception as e:
         print(f"❌ Error occurred: {e}")
@@ -224,6 +296,19 @@ async def estimation_destination():
             except Exception as close_error:
                 print(f"⚠️ Warning: Failed to close the browser - {close_error}")
 
+        await get_network_trace().close()
+        print(get_resource_router().format_stats())
+
+        # Deliver any Slack messages still queued
+        await s.aclose()
+        tracer.export()
+
+
+def cli(argv=None, prog=None):
+    # Everything is configured through the environment / .env
+    argparse.ArgumentParser(prog=prog, description="Import the estimation workbook into ASPIRE_ESTIMATION_ID.").parse_args(argv)
+    asyncio.run(estimation_destination())
+
 
 if __name__ == '__main__':
-    asyncio.run(estimation_destination())
\ No newline at end of file
+    cli()
\ No newline at end of file
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import math
+import os
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Columns of the Aspire estimation import (see aspire_upload_example.xlsx)
+ESTIMATION_COLUMNS = ["Group Name", "Service Name", "Item Name", "Uom", "Qty"]
+ESTIMATION_SHEET_TITLE = "AspireFormat Import"
+# Columns written as numbers; the rest are names and stay text
+NUMERIC_COLUMNS = {"Qty"}
+
+
+def normalize_cell(value, numeric=False):
+    # What goes into the workbook: blanks/NaN become None. Numeric columns turn
+    # numeric text ("100", " 2.5 ") into numbers; text columns keep text as written
+    # ("007" stays "007"), with numbers read by pandas written without a ".0"
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, (int, float)):
+        if numeric:
+            return value
+        return str(int(value)) if float(value).is_integer() else str(value)
+    text = str(value).strip()
+    if not text:
+        return None
+    if not numeric:
+        return text
+    try:
+        number = float(text)
+    except ValueError:
+        return text
+    if not math.isfinite(number):
+        return text
+    return int(text) if text.lstrip("+-").isdigit() else number
+
+
+def normalize_row(row, columns=ESTIMATION_COLUMNS):
+    return [normalize_cell(value, column in NUMERIC_COLUMNS) for value, column in zip(row, columns)]
+
+
+def canonical_row(row, columns=ESTIMATION_COLUMNS):
+    # Same value, same text: 100, 100.0 and "100" in Qty hash alike (and are written
+    # alike by build_workbook); blanks/NaN become ""
+    values = []
+    for value in normalize_row(row, columns):
+        if value is None:
+            values.append("")
+        elif isinstance(value, (int, float)):
+            values.append(repr(float(value)))
+        else:
+            values.append(value)
+    return values
+
+
+def iter_rows(source, columns=ESTIMATION_COLUMNS):
+    # source: DataFrame, CSV path or an iterable of sequences/dicts in column order
+    if isinstance(source, str):
+        import pandas as pd
+
+        # Chunks keep memory flat for very large estimates
+        # Text columns are read as text so names like "007" keep their leading zeros
+        text_columns = {column: str for column in columns if column not in NUMERIC_COLUMNS}
+        for chunk in pd.read_csv(source, usecols=columns, dtype=text_columns, chunksize=10_000):
+            yield from chunk[columns].itertuples(index=False, name=None)
+    elif hasattr(source, "itertuples"):
+        yield from source[columns].itertuples(index=False, name=None)
+    else:
+        for row in source:
+            yield tuple(row[c] for c in columns) if isinstance(row, dict) else tuple(row)
+
+
+def build_workbook(source, path, columns=ESTIMATION_COLUMNS, sheet_title=ESTIMATION_SHEET_TITLE):
+    # Streams rows into a write-only workbook and hashes their canonical form on
+    # the way. The xlsx bytes carry timestamps, so the hash is taken over the rows.
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_title)
+    sheet.append(columns)
+
+    digest = hashlib.sha256(json.dumps(columns).encode("utf-8"))
+    rows = 0
+    for row in iter_rows(source, columns):
+        digest.update(json.dumps(canonical_row(row, columns)).encode("utf-8"))
+        sheet.append(normalize_row(row, columns))
+        rows += 1
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp.xlsx"
+    workbook.save(tmp_path)
+    os.replace(tmp_path, path)
+    print(f"📄 Wrote {rows} estimation rows to {path}")
+    return digest.hexdigest(), rows
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class UploadLedger:
+
+    # Content hash of the last workbook imported into each estimation
+    def __init__(self, path=None):
+        self.path = path or os.getenv('ASPIRE_ESTIMATION_LEDGER', os.path.join(".cache", "estimation_uploads.json"))
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable upload ledger {self.path}: {e}")
+            return {}
+
+    def is_uploaded(self, estimation_id, digest):
+        entry = self.load().get(str(estimation_id))
+        return entry is not None and entry["digest"] == digest
+
+    def record(self, estimation_id, digest, file_path):
+        entries = self.load()
+        entries[str(estimation_id)] = {"digest": digest, "file": str(file_path), "uploaded_at": time.time()}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f, indent=2)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,118 @@
+import functools
+import hashlib
+import json
+import os
+import time
+
+from browser_use import Agent
+from browser_use.agent.service import log_response
+from dotenv import load_dotenv
+from pydantic import ValidationError
+
+from tracing import tracer
+
+load_dotenv()
+
+
+class LLMResponseCache:
+
+    # Agent decisions on disk, keyed on (task, step, compacted page state, model,
+    # files the agent may upload).
+    # The same page at the same step of the same task gets the recorded answer
+    # without a model call; a decision whose actions then fail is dropped.
+    def __init__(self, folder=None):
+        self.folder = folder or os.getenv('ASPIRE_LLM_CACHE_DIR', os.path.join(".cache", "llm_responses"))
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(task, step, dom_hash, model, file_paths=()):
+        # A recorded upload_file_directly names its file, so another file is another decision
+        payload = [task, step, dom_hash, model, sorted(file_paths or ())]
+        return hashlib.sha256(json.dumps(payload).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key)) as f:
+                output = json.load(f)["output"]
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            tracer.count("llm_cache_misses")
+            return None
+        self.hits += 1
+        tracer.count("llm_cache_hits")
+        return output
+
+    def put(self, key, output, **details):
+        os.makedirs(self.folder, exist_ok=True)
+        tmp_path = f"{self._path(key)}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"saved_at": time.time(), **details, "output": output}, f, indent=2)
+        os.replace(tmp_path, self._path(key))
+
+    def invalidate(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+@functools.cache
+def get_response_cache():
+    return LLMResponseCache()
+
+
+def page_state_hash(state, include_attributes):
+    # What the model is shown of the page: URL, title and the (compacted) element list
+    text = "\n".join([state.url, state.title, state.element_tree.clickable_elements_to_string(include_attributes)])
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedAgent(Agent):
+
+    # Agent that answers repeated page states from LLMResponseCache and times each model call
+    def __init__(self, *args, response_cache=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.response_cache = response_cache or get_response_cache()
+        self.use_response_cache = os.getenv('ASPIRE_LLM_CACHE', 'on') != 'off'
+        self.cache_key = None
+
+    async def get_next_action(self, input_messages):
+        self.cache_key = None
+        state = self.browser_context.session.cached_state if self.browser_context.session else None
+        if not self.use_response_cache or state is None:
+            with tracer.span("agent.llm"):
+                return await super().get_next_action(input_messages)
+
+        key = self.response_cache.key(self.task, self.state.n_steps,
+                                      page_state_hash(state, self.settings.include_attributes), self.model_name,
+                                      self.settings.available_file_paths)
+        started = time.time()
+        cached = self.response_cache.get(key)
+        try:
+            parsed = None if cached is None else self.AgentOutput.model_validate(cached)
+        except ValidationError:
+            # e.g. the last step only allows "done"
+            parsed = None
+        if parsed is not None:
+            self.cache_key = key
+            tracer.add_span("agent.llm_cached", started, time.time() - started)
+            tracer.count("llm_input_tokens_cached", self._message_manager.state.history.current_tokens)
+            log_response(parsed)
+            return parsed
+
+        with tracer.span("agent.llm"):
+            parsed = await super().get_next_action(input_messages)
+        self.response_cache.put(key, parsed.model_dump(exclude_unset=True), step=self.state.n_steps, model=self.model_name)
+        self.cache_key = key
+        return parsed
+
+    async def step(self, step_info=None):
+        await super().step(step_info)
+        # Don't keep serving a decision that did not work on this page
+        if self.cache_key and any(result.error for result in self.state.last_result or []):
+            self.response_cache.invalidate(self.cache_key)
+        self.cache_key = None
@@ -0,0 +1,224 @@
+import asyncio
+import gzip
+import itertools
+import json
+import os
+import random
+import re
+import time
+import weakref
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_list(name, default):
+    value = os.getenv(name, default)
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+class NetworkTraceWriter:
+
+    def __init__(self, folder, name, max_body_bytes=None, include=None, exclude=None, resource_types=None,
+                 sample_rate=None, batch_size=200, flush_interval=1.0, rotate_bytes=None):
+        self.folder = folder
+        self.name = name
+        self.max_body_bytes = max_body_bytes or int(os.getenv('ASPIRE_TRACE_MAX_BODY_BYTES', 64 * 1024))
+        # Takeoff documents are replayed by aspire_api, so they get a much larger cap
+        self.takeoff_max_body_bytes = int(os.getenv('ASPIRE_TRACE_TAKEOFF_MAX_BODY_BYTES', 16 * 1024 * 1024))
+        self.takeoff_pattern = re.compile(os.getenv('ASPIRE_TAKEOFF_API_PATTERN', 'takeoff'), re.IGNORECASE)
+        self.include = [re.compile(p) for p in (include or _env_list('ASPIRE_TRACE_INCLUDE', ''))]
+        self.exclude = [re.compile(p) for p in (exclude or _env_list('ASPIRE_TRACE_EXCLUDE', ''))]
+        # "all" traces every resource type; the API calls are what we read back later
+        self.resource_types = set(resource_types or _env_list('ASPIRE_TRACE_RESOURCE_TYPES', 'document,xhr,fetch'))
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.getenv('ASPIRE_TRACE_SAMPLE_RATE', 1.0))
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes or int(os.getenv('ASPIRE_TRACE_ROTATE_BYTES', 50 * 1024 * 1024))
+
+        self.ids = itertools.count(1)
+        self.traced = weakref.WeakKeyDictionary()  # request -> (id, started monotonic)
+        self.queue = None
+        self.task = None
+        self.pending = set()
+
+        self.part = 0
+        self.file = None
+        self.bytes_written = 0
+        os.makedirs(folder, exist_ok=True)
+
+    # === Capture (event loop side, never blocks) ===
+    def attach(self, page):
+        if self.task is None:
+            self.queue = asyncio.Queue()
+            self.task = asyncio.create_task(self._consume())
+        page.on("request", self._on_request)
+        page.on("response", self._on_response)
+        page.on("requestfailed", self._on_request_failed)
+
+    def _wanted(self, request):
+        if "all" not in self.resource_types and request.resource_type not in self.resource_types:
+            return False
+        url = request.url
+        if self.include and not any(p.search(url) for p in self.include):
+            return False
+        if any(p.search(url) for p in self.exclude):
+            return False
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def _body_limit(self, url):
+        return self.takeoff_max_body_bytes if self.takeoff_pattern.search(url) else self.max_body_bytes
+
+    def _cap(self, body, url):
+        if body is None:
+            return None, False
+        limit = self._body_limit(url)
+        if len(body) > limit:
+            return body[:limit], True
+        return body, False
+
+    def _on_request(self, request):
+        if not self._wanted(request):
+            return
+        trace_id = next(self.ids)
+        self.traced[request] = (trace_id, time.monotonic())
+
+        try:
+            body = request.post_data
+        except Exception:
+            body = None  # binary upload
+        body, truncated = self._cap(body, request.url)
+        self.queue.put_nowait({
+            "type": "request",
+            "id": trace_id,
+            "time": time.time(),
+            "method": request.method,
+            "url": request.url,
+            "resource_type": request.resource_type,
+            "headers": request.headers,
+            "body": body,
+            "body_truncated": truncated,
+        })
+
+    def _on_response(self, response):
+        traced = self.traced.get(response.request)
+        if traced is None:
+            return
+        task = asyncio.create_task(self._record_response(response, *traced))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def _record_response(self, response, trace_id, started):
+        headers = response.headers
+        event = {
+            "type": "response",
+            "id": trace_id,
+            "time": time.time(),
+            "url": response.url,
+            "status": response.status,
+            "headers": headers,
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+            "timing": response.request.timing,
+            "body": None,
+            "body_truncated": False,
+        }
+
+        # Only JSON bodies are kept, and large ones are skipped before download when possible
+        if "json" in headers.get("content-type", ""):
+            length = int(headers.get("content-length") or 0)
+            if length > self._body_limit(response.url):
+                event["body_size"] = length
+                event["body_truncated"] = True
+            else:
+                try:
+                    body = await response.body()
+                    event["body_size"] = len(body)
+                    event["body"], event["body_truncated"] = self._cap(body.decode("utf-8", errors="ignore"), response.url)
+                except Exception as e:
+                    event["body_error"] = str(e)
+
+        self.queue.put_nowait(event)
+
+    def _on_request_failed(self, request):
+        traced = self.traced.get(request)
+        if traced is None:
+            return
+        trace_id, started = traced
+        self.queue.put_nowait({
+            "type": "failed",
+            "id": trace_id,
+            "time": time.time(),
+            "url": request.url,
+            "failure": request.failure,
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+        })
+
+    # === Writing (batched, off the event loop) ===
+    async def _consume(self):
+        closing = False
+        while not closing:
+            batch = []
+            waiters = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = None if not batch and not waiters else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    event = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if event is None:
+                    closing = True
+                    break
+                if isinstance(event, asyncio.Future):
+                    waiters.append(event)
+                    break
+                batch.append(event)
+
+            if batch:
+                await asyncio.to_thread(self._write_batch, batch)
+            for waiter in waiters:
+                waiter.set_result(None)
+        await asyncio.to_thread(self._close_file)
+
+    def _write_batch(self, batch):
+        try:
+            if self.file is None or self.bytes_written >= self.rotate_bytes:
+                self._close_file()
+                path = os.path.join(self.folder, f"{self.name}_{self.part:03d}.jsonl.gz")
+                self.file = gzip.open(path, "wt", encoding="utf-8")
+                self.bytes_written = 0
+                self.part += 1
+            data = "".join(json.dumps(event, ensure_ascii=False) + "\n" for event in batch)
+            self.file.write(data)
+            self.file.flush()  # keep the trace readable while the run is still going
+            self.bytes_written += len(data)
+        except Exception as e:
+            print(f"⚠️ Network trace write error: {e}")
+
+    def _close_file(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    async def flush(self):
+        # Wait until everything captured so far is on disk
+        if self.task is None:
+            return
+        if self.pending:
+            await asyncio.gather(*self.pending, return_exceptions=True)
+        waiter = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait(waiter)
+        await waiter
+
+    async def close(self):
+        if self.task is None:
+            return
+        # Let in-flight response bodies land in the queue before the sentinel
+        if self.pending:
+            await asyncio.gather(*self.pending, return_exceptions=True)
+        self.queue.put_nowait(None)
+        await self.task
+        self.task = None
@@ -1,42 +1,29 @@
+import argparse
 import asyncio
+import functools
 import os
 from datetime import datetime
 
-import pandas as pd
 from dotenv import load_dotenv
-from playwright.async_api import async_playwright
 
-from browser_use import Agent, Browser, BrowserConfig, BrowserContextConfig
-from browser_use.agent.service import BrowserContext
-from langchain_openai import ChatOpenAI
-from portkey_ai import createHeaders, PORTKEY_GATEWAY_URL
-from slack import Slack
+import clients
+from clients import get_browser, get_llm, get_resource_router, get_slack, new_browser_context
+from checkpoint import TakeoffCheckpoint, retry_with_backoff
+from network_trace import NetworkTraceWriter
+from readiness import attach as attach_readiness, register_readiness_actions
+from session_cache import SessionCache
+from tracing import tracer
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Slack instance
-slack = Slack()
+# Cached login session shared across runs
+session_cache = SessionCache()
 
 # Timestamp and folder for logs
 timestamp = datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
 llm_conversation_folder_name = f"logs-{timestamp}"
 log_folder = os.path.join("logs", "api_logs", "property_destination")
-os.makedirs(log_folder, exist_ok=True)  # Ensure the directory exists
-log_file = os.path.join(log_folder, f"api_logs_{timestamp}.txt")
-
-# Load Portkey headers for LLM
-portkey_headers = createHeaders(
-    api_key=os.getenv('PORT_KEY_API'),
-    virtual_key=os.getenv('PORT_KEY_VIRTUAL_KEY')
-)
-
-llm = ChatOpenAI(
-    model=os.getenv('OPENAI_LLM_MODEL'),
-    api_key="",
-    base_url=PORTKEY_GATEWAY_URL,
-    default_headers=portkey_headers
-)
 
 # variables
 aspire_login_url = os.getenv('ASPIRE_LOGIN_URL')
@@ -46,220 +33,256 @@ aspire_login_pin = os.getenv('ASPIRE_LOGIN_PIN')
 aspire_login_device_name = os.getenv('ASPIRE_LOGIN_DEVICE_NAME')
 aspire_property_id = os.getenv('ASPIRE_PROPERTY_ID')
 aspire_property_base_url = os.getenv('ASPIRE_PROPERTY_BASE_URL')
-
-# Configure browser with stealth options
-config = BrowserConfig(
-    headless=True,  # Run in headless mode (can be False for debugging)
-    disable_security=True,
-    extra_chromium_args=[
-        "--disable-blink-features=AutomationControlled", # Removes navigator.webdriver = true
-    ]
-)
-
-# Define a realistic and modern user-agent
-realistic_user_agent = (
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-    "AppleWebKit/537.36 (KHTML, like Gecko) "
-    "Chrome/135.0.0.0 Safari/537.36"
-)
-
-# Context configuration to spoof headers
-context_config = BrowserContextConfig(
-    user_agent=realistic_user_agent,
-)
-
-browser = Browser(config)
-browser_context = BrowserContext(browser=browser, config=context_config)
-
-# Initial browser actions to log in and reach target page
-initial_actions_for_property_destination = [
+aspire_takeoff_api_pattern = os.getenv('ASPIRE_TAKEOFF_API_PATTERN', 'takeoff')
+aspire_takeoff_save_pattern = os.getenv('ASPIRE_TAKEOFF_SAVE_PATTERN', aspire_takeoff_api_pattern)  # regex of the Save request URL
+aspire_takeoff_recalc_pattern = os.getenv('ASPIRE_TAKEOFF_RECALC_PATTERN', 'recalc')  # regex of the recalculation requests
+aspire_save_timeout_seconds = int(os.getenv('ASPIRE_SAVE_TIMEOUT_SECONDS', 30))
+aspire_fill_mode = os.getenv('ASPIRE_FILL_MODE', 'bulk')  # "bulk", "row", "incremental" or "api"
+aspire_agent_mode = os.getenv('ASPIRE_AGENT_MODE', 'scripted')  # "scripted" or "agent"
+aspire_takeoff_snapshot = os.getenv('ASPIRE_TAKEOFF_SNAPSHOT')  # e.g. takeoff_service_items.csv or .parquet
+aspire_reconciliation_output = os.getenv('ASPIRE_RECONCILIATION_OUTPUT', 'takeoff_reconciliation.csv')  # .csv or .json
+aspire_checkpoint = os.getenv('ASPIRE_CHECKPOINT', 'on') != 'off'  # journal saved rows so a rerun resumes
+aspire_checkpoint_save_every = int(os.getenv('ASPIRE_CHECKPOINT_SAVE_EVERY', 1000))  # rows per Save; 0 saves once at the end
+aspire_retry_attempts = int(os.getenv('ASPIRE_RETRY_ATTEMPTS', 3))
+aspire_retry_backoff_seconds = float(os.getenv('ASPIRE_RETRY_BACKOFF_SECONDS', 5))
+aspire_row_retry_attempts = int(os.getenv('ASPIRE_ROW_RETRY_ATTEMPTS', 2))
+
+# Values the fallback agent may type but must never see
+aspire_sensitive_data = {k: v for k, v in {
+    "aspire_login_email": aspire_login_email,
+    "aspire_login_password": aspire_login_password,
+    "aspire_login_pin": aspire_login_pin,
+}.items() if v}
+
+# Buffered network trace of the Aspire API traffic; created on first use
+@functools.cache
+def get_network_trace():
+    return NetworkTraceWriter(log_folder, f"api_logs_{timestamp}")
+
+
+# Controller with readiness waits for the initial actions
+@functools.cache
+def get_controller():
+    from browser_use import Controller
+    return register_readiness_actions(Controller())
+
+
+# Browser actions to log in to Aspire
+login_actions_for_property_destination = [
     {"go_to_url": {"url": "{aspire_login_url}".format(aspire_login_url=aspire_login_url)}},
-    {"wait": {"seconds": 10}},
+    {"wait_for_selector": {"selector": "input[type='password']", "timeout": 10}},
     {"input_text": {"index": 1, "text": "{aspire_login_email}".format(aspire_login_email=aspire_login_email)}},
     {"input_text": {"index": 2, "text": "{aspire_login_password}".format(aspire_login_password=aspire_login_password)}},
     {"input_text": {"index": 3, "text": "{aspire_login_pin}".format(aspire_login_pin=aspire_login_pin)}},
     {"input_text": {"index": 4, "text": "{aspire_login_device_name}".format(aspire_login_device_name=aspire_login_device_name)}},
     {"click_element": {"index": 6}},
-    {"wait": {"seconds": 5}},
-    {"go_to_url": {"url": "{aspire_property_base_url}/{aspire_property_id}".format(aspire_property_base_url=aspire_property_base_url, aspire_property_id=aspire_property_id)}},
-    {"wait": {"seconds": 20}},
+    {"wait_for_network_idle": {"timeout": 5}},
+]
+
+def build_property_url(property_id):
+    return "{aspire_property_base_url}/{property_id}".format(aspire_property_base_url=aspire_property_base_url, property_id=property_id)
+
+# Browser actions to open the property page
+def build_open_property_actions(property_id):
+    return [
+        {"go_to_url": {"url": build_property_url(property_id)}},
+        {"wait_for_network_idle": {"timeout": 20}},
+    ]
+
+# Browser actions to open the takeoff from the property page
+open_takeoff_actions = [
     {"click_element": {"index": 21}}, # click on the ellipsis button
-    {"wait": {"seconds": 5}},
+    {"wait_for_network_idle": {"timeout": 5}},
     {"click_element": {"index": 77}}, # click on the "Takeoff" button
-    {"wait": {"seconds": 10}},
+    {"wait_for_response": {"url_pattern": aspire_takeoff_api_pattern, "timeout": 10}},
+    {"wait_for_selector": {"selector": "tr.ng-star-inserted", "state": "attached", "timeout": 10}},
     {"click_element": {"index": 4}}, # click on the collapse button
-    {"wait": {"seconds": 5}},
+    {"wait_for_network_idle": {"timeout": 5}},
 ]
 
-# === Logging Functions ===
-async def log_request_headers(request):
-    try:
-        with open(log_file, "a") as f:
-            f.write(f"\n🔹 [API] {request.method} {request.url}\n")
-            f.write("Headers:\n")
-            for k, v in request.headers.items():
-                f.write(f"  {k}: {v}\n")
-            if request.method in ["POST", "PUT", "PATCH", "GET"]:
-                try:
-                    post_data = request.post_data
-                    if post_data:
-                        f.write("\nBody:\n")
-                        f.write(f"{post_data}\n")
-                except Exception as e:
-                    f.write(f"\n⚠️ Failed to get request body: {e}\n")
-    except Exception as e:
-        print(f"⚠️ Request log error: {e}")
-
-async def log_response_headers(response):
-    try:
-        headers = await response.all_headers()
-        content_type = headers.get("content-type", "")
-        status = response.status
-        url = response.url
-
-        with open(log_file, "a") as f:
-            f.write(f"\nResponse [{status}] for {url}\n")
-            f.write("Headers:\n")
-            for k, v in headers.items():
-                f.write(f"  {k}: {v}\n")
-            if "application/json" in content_type:
-                try:
-                    body = await response.body()
-                    decoded = body.decode("utf-8", errors="ignore")
-                    f.write("\nResponse Body:\n")
-                    f.write(f"{decoded}\n")
-                except Exception as e:
-                    f.write(f"\n⚠️ Failed to decode JSON body: {e}\n")
-    except Exception as e:
-        print(f"⚠️ Response log error: {e}")
+# Initial browser actions to log in and reach target page
+initial_actions_for_property_destination = login_actions_for_property_destination + build_open_property_actions(aspire_property_id) + open_takeoff_actions
+
+
+async def prepare_page(browser_context):
+    return await clients.prepare_page(browser_context, get_network_trace())
+
+
+async def open_takeoff(browser, browser_context, page, property_id, session_cache=session_cache, restore=True):
+    # Reuse the cached login when it is still valid; a context that is already
+    # logged in (restore=False) only needs the same validity check
+    initial_actions = login_actions_for_property_destination + build_open_property_actions(property_id) + open_takeoff_actions
+    with tracer.span("session.restore"):
+        restored = await session_cache.restore(browser_context) if restore else True
+        if restored and await session_cache.is_valid(page, build_property_url(property_id)):
+            initial_actions = open_takeoff_actions
+
+    from llm_cache import CachedAgent
+    from scripted_actions import run_scripted
+
+    controller = get_controller()
+
+    def make_agent(task, initial_actions=None):
+        return CachedAgent(
+            task=task,
+            llm=get_llm(),
+            controller=controller,
+            save_conversation_path=f"logs/llm_coversation/property_destination/{llm_conversation_folder_name}/{property_id}/conversation",
+            use_vision=False,
+            sensitive_data=aspire_sensitive_data,
+            initial_actions=initial_actions,
+            browser=browser,
+            browser_context=browser_context
+        )
+
+    if aspire_agent_mode == "agent":
+        with tracer.span("agent.run"):
+            history = await make_agent("wait for 10 seconds only.", initial_actions).run()
+    else:
+        # The steps are fixed, so run them without the LLM; the agent only takes over on failure
+        history = await run_scripted(
+            initial_actions, controller, browser_context,
+            goal=f"Open the Takeoff of Aspire property {property_id} and collapse its service tree.",
+            agent_factory=make_agent,
+            sensitive_data=aspire_sensitive_data,
+        )
+    tracer.record_agent_history(history)
+    await session_cache.save(browser_context)
+
+
+async def fill_and_save_takeoff(page, property_id, df, checkpoint=None):
+    from takeoff import bulk_fill_takeoff, fill_takeoff_rows, fill_with_retries, incremental_fill_takeoff, save_takeoff, takeoff_items
+
+    report = {"filled": [], "missing": [], "not_editable": [], "unchanged": [], "confirmed": [], "not_persisted": [], "unverified": []}
+    if checkpoint is not None:
+        df, report["unchanged"] = checkpoint.pending(df)
+        if report["unchanged"]:
+            print(f"⏩ {len(report['unchanged'])} takeoff items were already saved by an earlier attempt")
+        if df.empty:
+            return report
+
+    if aspire_fill_mode == "api":
+        # Push straight to the API with the request shapes and token captured by the browser
+        from aspire_api import AspireApiClient, find_log_files
+
+        await get_network_trace().flush()
+        async with AspireApiClient.from_logs(find_log_files(log_folder)) as client:
+            api_report = await client.push_takeoff(property_id, df)
+        if checkpoint is not None:
+            values = {item["name"]: item["value"] for item in takeoff_items(df)}
+            checkpoint.record("saved", {name: values[name] for name in api_report["filled"] if name in values})
+        api_report.setdefault("unchanged", []).extend(report["unchanged"])
+        return api_report
+
+    if aspire_fill_mode == "row":
+        fill = fill_takeoff_rows
+    elif aspire_fill_mode == "incremental":
+        fill = incremental_fill_takeoff
+    else:
+        fill = bulk_fill_takeoff
+
+    # Save every few thousand rows so a failure late in a large takeoff keeps the earlier work
+    batch_size = aspire_checkpoint_save_every if checkpoint is not None and aspire_checkpoint_save_every else len(df)
+    for start in range(0, len(df), batch_size):
+        batch = df.iloc[start:start + batch_size]
+        # Only recalculation failures caused by this batch's writes count against its Save
+        marker = attach_readiness(page).mark()
+        batch_report = await fill_with_retries(fill, page, batch, attempts=aspire_row_retry_attempts)
+        for key in report:
+            report[key].extend(batch_report.get(key, []))
+
+        values = {item["name"]: item["value"] for item in takeoff_items(batch)}
+        written = {name: values[name] for name in batch_report["filled"] if name in values}
+        if checkpoint is not None:
+            checkpoint.record("written", written)
+        saved = []
+        if written:
+            ack = await save_takeoff(page, written, aspire_takeoff_save_pattern, aspire_takeoff_recalc_pattern,
+                                     timeout=aspire_save_timeout_seconds, since=marker)
+            for key in ("confirmed", "not_persisted", "unverified"):
+                report[key].extend(ack[key])
+            if ack.get("unchanged"):
+                # Save stayed disabled: these already held the values written
+                unchanged = set(ack["unchanged"])
+                report["filled"] = [name for name in report["filled"] if name not in unchanged]
+                report["unchanged"].extend(ack["unchanged"])
+            saved = ack["confirmed"] + ack["unverified"] + ack.get("unchanged", [])
+        elif aspire_fill_mode == "incremental":
+            print("✅ Takeoff already up to date, nothing to save")
+        if checkpoint is not None:
+            done = saved + batch_report.get("unchanged", [])
+            checkpoint.record("saved", {name: values[name] for name in done if name in values})
+    return report
+
+
+async def process_property(browser, browser_context, page, property_id, df, session_cache=session_cache, restore=True, opened=False):
+    # A failed attempt reopens the takeoff (re-checking the session) after a backoff
+    # and carries on from the checkpoint instead of starting over
+    checkpoint = TakeoffCheckpoint(property_id) if aspire_checkpoint else None
+
+    async def attempt(number):
+        current_page = page if number == 1 else await browser_context.get_current_page()
+        if number > 1 or not opened:
+            with tracer.span("property.open_takeoff", property_id=property_id, attempt=number):
+                await open_takeoff(browser, browser_context, current_page, property_id,
+                                   session_cache=session_cache, restore=restore or number > 1)
+        with tracer.span("property.fill_and_save", property_id=property_id, rows=len(df), attempt=number):
+            return await fill_and_save_takeoff(current_page, property_id, df, checkpoint)
+
+    report = await retry_with_backoff(attempt, aspire_retry_attempts, aspire_retry_backoff_seconds, label=f"Property {property_id}")
+    if checkpoint is not None and not report.get("error"):
+        checkpoint.finish()
+    return report
 
 
 async def property_destination():
+    import pandas as pd
+    from playwright.async_api import async_playwright
+    from reconciliation import reconcile, save_report, summarize
+    from takeoff import extract_takeoff, format_fill_report, save_takeoff_snapshot, takeoff_to_dataframe
+
+    tracer.name = "property_destination"
+    slack = get_slack()
+    browser = get_browser()
+    browser_context = new_browser_context(browser)
     try:
         async with async_playwright():
 
-            page = await browser_context.get_current_page()
-
-            # Patch headers right after page is created
-            await page.set_extra_http_headers({
-                "sec-ch-ua": '"Google Chrome";v="135", "Not-A.Brand";v="8", "Chromium";v="135"',
-                "sec-ch-ua-mobile": "?0",
-                "sec-ch-ua-platform": '"macOS"',
-            })
-
-            # Attach stealth anti-detection patches
-            await page.add_init_script("""
-                // Hide webdriver
-                Object.defineProperty(navigator, 'webdriver', { get: () => false });
-
-                // Spoof browser environment
-                window.chrome = { runtime: {} };
-                Object.defineProperty(navigator, 'plugins', { get: () => [1, 2, 3] });
-                Object.defineProperty(navigator, 'languages', { get: () => ['en-US', 'en'] });
-            """)
-
-            # Attach logging before any actions
-            page.on("request", lambda request: asyncio.create_task(log_request_headers(request)))
-            page.on("response", lambda response: asyncio.create_task(log_response_headers(response)))
-
-            agent = Agent(
-                task="wait for 10 seconds only.",
-                llm=llm,
-                save_conversation_path=f"logs/llm_coversation/property_destination/{llm_conversation_folder_name}/conversation",
-                use_vision=False,
-                initial_actions=initial_actions_for_property_destination,
-                browser=browser,
-                browser_context=browser_context
-            )
-            await agent.run()
+            page = await prepare_page(browser_context)
+            with tracer.span("property.open_takeoff", property_id=aspire_property_id):
+                await retry_with_backoff(
+                    lambda attempt: open_takeoff(browser, browser_context, page, aspire_property_id),
+                    aspire_retry_attempts, aspire_retry_backoff_seconds, label="Opening the takeoff",
+                )
 
             # === Extract Service Items ===
-            # slack.sendMessageToChannel('Extracting: Takeoff data with Service Items and Measurements')
-
-            # rows = await page.locator("tr.ng-star-inserted").all()
-            # data = []
-            # current_parent = None
-
-            # for row in rows:
-            #     cells = row.locator("td")
-            #     service_item = (await cells.nth(0).text_content() or "").strip()
-            #     measurement = (await cells.nth(1).text_content() or "").strip()
-
-            #     toggler_btn = row.locator('button.p-treetable-toggler')
-            #     style = await toggler_btn.get_attribute("style") if await toggler_btn.count() > 0 else ""
-
-            #     if "margin-left: 0px" in style:
-            #         current_parent = service_item
-            #     elif "margin-left:" in style and current_parent:
-            #         data.append({
-            #             "serviceType": current_parent,
-            #             "serviceItemType": service_item,
-            #             "measurement": measurement
-            #         })
-
-            # df = pd.DataFrame(data)
-            # df.to_csv("takeoff_service_items.csv", index=False)
-            # print("✅ Data saved to takeoff_service_items.csv")
-            # slack.sendMessageToChannel('Extracted: Takeoff data with Service Items and Measurements')
+            snapshot_df = None
+            if aspire_takeoff_snapshot:
+                slack.sendMessageToChannel('Extracting: Takeoff data with Service Items and Measurements')
+                snapshot_df = takeoff_to_dataframe(await extract_takeoff(page))
+                snapshot_path = save_takeoff_snapshot(snapshot_df, aspire_takeoff_snapshot)
+                print(f"✅ Data saved to {snapshot_path}")
+                slack.sendMessageToChannel(f'Extracted: {len(snapshot_df)} Service Items and Measurements')
 
             # === Fill Data ===
             df = pd.read_csv('takeoff_data.csv')
             slack.sendMessageToChannel('Data filling: Takeoff data with measurement values are filling...')
 
-            for _, item in df.iterrows():
-                service_name = item["serviceItemType"]
-                value = str(item["value"])
-
-                print(f"Processing: {service_name} -> {value}")
-                row = page.locator("tr.ng-star-inserted").filter(has_text=service_name)
-                input_fields = await row.locator("input.e-control.e-numerictextbox").all()
-
-                for input_field in input_fields:
-                    if await input_field.is_visible():
-                        await input_field.clear()
-                        await input_field.fill(value)
-                        # await input_field.press("Enter")
-                        await input_field.press("Tab")
-                        print(f"Entered {value} for '{service_name}'")
-                        break
-
-                await page.wait_for_timeout(3000)
-
-            save_button = page.locator("button.p-button-success:has-text('Save'):not([disabled])")
-            await save_button.click()
-            await page.wait_for_timeout(3000)
-            slack.sendMessageToChannel('Data filled: Takeoff data with measurement values are filled')
-
-            # # === Send Summary ===
-            # takeoff_data_df = pd.read_csv("takeoff_data.csv")
-            # takeoff_service_items_df = pd.read_csv("takeoff_service_items.csv")
-
-            # service_items_set = set(takeoff_service_items_df["serviceItemType"])
-            # takeoff_data_set = set(takeoff_data_df["serviceItemType"])
-
-            # only_in_takeoff_data = takeoff_data_set - service_items_set
-            # only_in_service_items = service_items_set - takeoff_data_set
-            # in_both = service_items_set & takeoff_data_set
+            # Retries and the checkpoint pick up from here if the fill or a Save fails
+            fill_report = await process_property(browser, browser_context, page, aspire_property_id, df, opened=True)
 
-            # takeoff_data_dict = dict(zip(takeoff_data_df["serviceItemType"], takeoff_data_df["value"]))
-            # both_items_with_values = [f"{item}: {takeoff_data_dict[item]}" for item in in_both]
+            print(format_fill_report(fill_report))
+            if fill_report.get("not_persisted"):
+                slack.sendMessageToChannel('⚠️ Takeoff saved, but Aspire kept different values for some items\n' + format_fill_report(fill_report))
+            else:
+                slack.sendMessageToChannel('Data filled: Takeoff data with measurement values are filled and saved\n' + format_fill_report(fill_report))
 
-            # def format_list(items):
-            #     return "\n".join(items) if items else "None"
-
-            # message = f"""
-            #     🚀 Takeoff Data Upload Summary 🚀
-
-            #     1️⃣ ServiceItems present in takeoff_data.csv but NOT in takeoff_service_items.csv:
-            #     {format_list(only_in_takeoff_data)}
-
-            #     2️⃣ ServiceItems that are not updated:
-            #     {format_list(only_in_service_items)}
-
-            #     3️⃣ ServiceItems that are updated with values:
-            #     {format_list(both_items_with_values)}
-            # """
-            # slack.sendMessageToChannel(message)
+            # === Send Summary ===
+            if snapshot_df is not None:
+                reconciliation = reconcile(df, snapshot_df, aspire_property_id, fill_report)
+                save_report(reconciliation, aspire_reconciliation_output)
+                print(f"✅ Reconciliation saved to {aspire_reconciliation_output}")
+                slack.sendMessageToChannel(summarize(reconciliation))
 
     except Exception as e:
         print(f"❌ Error occurred: {e}")
@@ -273,6 +296,20 @@ async def property_destination():
             except Exception as close_error:
                 print(f"⚠️ Warning: Failed to close the browser - {close_error}")
 
+        await get_network_trace().close()
+        print(get_resource_router().format_stats())
+
+        # Deliver any Slack messages still queued
+        await slack.aclose()
+        tracer.export()
+
+
+def cli(argv=None, prog=None):
+    # Everything is configured through the environment / .env
+    argparse.ArgumentParser(prog=prog, description="Fill the Takeoff of ASPIRE_PROPERTY_ID from takeoff_data.csv.").parse_args(argv)
+    asyncio.run(property_destination())
+
 
 # Run the async function
-asyncio.run(property_destination())
\ No newline at end of file
+if __name__ == '__main__':
+    cli()
\ No newline at end of file
@@ -0,0 +1,181 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from clients import get_browser, get_resource_router, get_slack, new_browser_context
+from property_destination import get_network_trace, prepare_page, process_property, session_cache
+from session_cache import SessionCache
+from tracing import tracer
+
+
+class ContextPool:
+
+    # Bounded set of browser contexts on the one shared Chromium process. A context
+    # stays logged in between jobs; it is recycled when a job fails in it, after
+    # max_jobs jobs, or once its JS heap grows past max_heap_mb.
+    def __init__(self, browser, size, shared_session=True, prepare=prepare_page, max_jobs=None, max_heap_mb=None):
+        self.browser = browser
+        self.shared_session = shared_session
+        self.prepare = prepare
+        self.max_jobs = max_jobs
+        self.max_heap_mb = max_heap_mb
+        self.slots = asyncio.Queue()
+        for slot in range(size):
+            self.slots.put_nowait({"slot": slot, "context": None, "page": None, "jobs": 0})
+
+    async def _open(self, slot):
+        slot["context"] = new_browser_context(self.browser)
+        slot["page"] = await self.prepare(slot["context"])
+        slot["jobs"] = 0
+        slot["session_cache"] = session_cache if self.shared_session else SessionCache(name=f"runner_context_{slot['slot']}")
+
+    async def _discard(self, slot):
+        try:
+            await slot["context"].close()
+        except Exception as e:
+            print(f"⚠️ Failed to close browser context {slot['slot']}: {e}")
+        slot["context"] = None
+        slot["page"] = None
+
+    async def _should_recycle(self, slot):
+        if self.max_jobs and slot["jobs"] >= self.max_jobs:
+            print(f"♻️ Recycling browser context {slot['slot']} after {slot['jobs']} jobs")
+            return True
+        if self.max_heap_mb:
+            try:
+                heap = await slot["page"].evaluate("() => performance.memory ? performance.memory.usedJSHeapSize : 0")
+            except Exception:
+                return True
+            if heap / 1024 / 1024 > self.max_heap_mb:
+                print(f"♻️ Recycling browser context {slot['slot']}: JS heap at {heap / 1024 / 1024:.0f} MB")
+                return True
+        return False
+
+    @asynccontextmanager
+    async def context(self):
+        slot = await self.slots.get()
+        try:
+            if slot["context"] is None:
+                await self._open(slot)
+            yield slot
+            slot["jobs"] += 1
+            if await self._should_recycle(slot):
+                await self._discard(slot)
+        except Exception:
+            await self._discard(slot)
+            raise
+        finally:
+            self.slots.put_nowait(slot)
+
+    async def close(self):
+        while not self.slots.empty():
+            slot = self.slots.get_nowait()
+            if slot["context"] is not None:
+                await self._discard(slot)
+
+
+async def run_job(pool, property_id, takeoff_csv):
+    import pandas as pd
+
+    started = time.monotonic()
+    result = {"property_id": property_id, "takeoff_csv": takeoff_csv, "status": "ok",
+              "filled": 0, "missing": [], "not_editable": [], "error": None}
+    try:
+        df = await asyncio.to_thread(pd.read_csv, takeoff_csv)
+        async with pool.context() as slot:
+            report = await process_property(
+                pool.browser, slot["context"], slot["page"], property_id, df,
+                session_cache=slot["session_cache"], restore=slot["jobs"] == 0,
+            )
+        result["filled"] = len(report["filled"])
+        result["missing"] = report["missing"]
+        result["not_editable"] = report["not_editable"]
+        if report.get("error"):
+            result["status"], result["error"] = "error", report["error"]
+    except Exception as e:
+        print(f"❌ Property {property_id} failed: {e}")
+        result["status"], result["error"] = "error", str(e)
+
+    result["seconds"] = round(time.monotonic() - started, 1)
+    print(f"{'✅' if result['status'] == 'ok' else '❌'} Property {property_id}: {result['filled']} filled, "
+          f"{len(result['missing'])} missing in {result['seconds']}s")
+    return result
+
+
+async def run_properties(jobs, concurrency, shared_session=True):
+    # jobs: list of (property_id, takeoff CSV path)
+    pool = ContextPool(get_browser(), concurrency, shared_session=shared_session)
+    results = []
+    try:
+        # Without a usable cached session, log in once before fanning out so the
+        # other contexts can reuse it instead of all logging in at the same time
+        remaining = list(jobs)
+        if shared_session and remaining and session_cache.load() is None:
+            results.append(await run_job(pool, *remaining.pop(0)))
+
+        results.extend(await asyncio.gather(*(run_job(pool, property_id, csv) for property_id, csv in remaining)))
+    finally:
+        await pool.close()
+    return results
+
+
+def load_jobs(args):
+    import pandas as pd
+
+    if args.manifest:
+        manifest = pd.read_csv(args.manifest, dtype=str)
+        return list(zip(manifest["property_id"], manifest["takeoff_csv"]))
+    return [(property_id, args.csv) for property_id in args.property_id]
+
+
+async def main(args):
+    tracer.name = "property_runner"
+    jobs = load_jobs(args)
+    started = time.monotonic()
+    try:
+        results = await run_properties(jobs, args.concurrency, shared_session=not args.no_shared_session)
+    finally:
+        try:
+            await get_browser().close()
+        except Exception as e:
+            print(f"⚠️ Warning: Failed to close the browser - {e}")
+        await get_network_trace().close()
+        print(get_resource_router().format_stats())
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    failed = [r for r in results if r["status"] != "ok"]
+    summary = (f"Takeoff runner: {len(results) - len(failed)}/{len(results)} properties filled "
+               f"in {time.monotonic() - started:.0f}s (concurrency {args.concurrency}).")
+    if failed:
+        summary += "\nFailed: " + ", ".join(f"{r['property_id']} ({r['error']})" for r in failed)
+    print(summary)
+    print(f"✅ Results saved to {args.output}")
+    get_slack().sendMessageToChannel(summary)
+    await get_slack().aclose()
+    tracer.export()
+
+
+def cli(argv=None, prog=None):
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
+    parser = argparse.ArgumentParser(prog=prog, description="Fill takeoffs for many Aspire properties concurrently.")
+    parser.add_argument("--manifest", help="CSV with property_id and takeoff_csv columns")
+    parser.add_argument("--property-id", action="append", default=[], help="Property to fill with --csv; repeat for several")
+    parser.add_argument("--csv", default="takeoff_data.csv")
+    parser.add_argument("--concurrency", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--no-shared-session", action="store_true", help="Log every context in separately")
+    parser.add_argument("--output", default=os.path.join("logs", "runner", f"results_{timestamp}.json"))
+    args = parser.parse_args(argv)
+    if not args.manifest and not args.property_id:
+        parser.error("pass --manifest or at least one --property-id")
+    asyncio.run(main(args))
+
+
+if __name__ == '__main__':
+    cli()
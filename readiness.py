@@ -0,0 +1,152 @@
+import asyncio
+import itertools
+import re
+import time
+import weakref
+from collections import deque
+
+
+# Requests that stay open by design and would keep the page from ever going idle
+LONG_LIVED_RESOURCE_TYPES = {"eventsource", "websocket"}
+
+_trackers = weakref.WeakKeyDictionary()
+
+
+class PageReadiness:
+
+    def __init__(self, page, history_size=500):
+        self.page = page
+        self.inflight = set()
+        self.last_activity = time.monotonic()
+        # (sequence number, response); waits only match responses after a mark()
+        self.sequence = itertools.count(1)
+        self.last_sequence = 0
+        self.since = 0
+        self.responses = deque(maxlen=history_size)
+        self.failures = deque(maxlen=history_size)
+        self.response_arrived = asyncio.Event()
+
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_request_done)
+        page.on("requestfailed", self._on_request_done)
+        page.on("response", self._on_response)
+
+    def _on_request(self, request):
+        if request.resource_type not in LONG_LIVED_RESOURCE_TYPES:
+            self.inflight.add(request)
+        self.last_activity = time.monotonic()
+
+    def _on_request_done(self, request):
+        self.inflight.discard(request)
+        self.last_activity = time.monotonic()
+
+    def _on_response(self, response):
+        self.last_sequence = next(self.sequence)
+        self.responses.append((self.last_sequence, response))
+        if response.status >= 400:
+            self.failures.append((self.last_sequence, response))
+        self.response_arrived.set()
+
+    def mark(self):
+        # Call when an action starts: responses from before it (an earlier attempt, the
+        # previous job in a reused context) no longer satisfy waits or count as failures
+        self.since = self.last_sequence
+        return self.since
+
+    async def wait_for_selector(self, selector, state="visible", timeout=20):
+        try:
+            await self.page.wait_for_selector(selector, state=state, timeout=timeout * 1000)
+            return True
+        except Exception:
+            return False
+
+    async def wait_for_network_idle(self, timeout=20, idle_time=0.5):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self.inflight and time.monotonic() - self.last_activity >= idle_time:
+                return True
+            await asyncio.sleep(0.05)
+        return False
+
+    async def wait_for_response(self, url_pattern, timeout=20, since=None):
+        # Each recorded response after the last mark() (or since) satisfies at most one
+        # wait, so a response that arrived between the triggering click and this call
+        # is not missed
+        pattern = re.compile(url_pattern, re.IGNORECASE)
+        since = self.since if since is None else since
+        deadline = time.monotonic() + timeout
+        while True:
+            for entry in list(self.responses):
+                if entry[0] > since and pattern.search(entry[1].url):
+                    self.responses.remove(entry)
+                    return entry[1]
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            self.response_arrived.clear()
+            try:
+                await asyncio.wait_for(self.response_arrived.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return None
+
+    def take_failures(self, url_pattern, since=None):
+        # Non-2xx/3xx responses matching the pattern since the last call and after the
+        # last mark() (or since)
+        pattern = re.compile(url_pattern, re.IGNORECASE)
+        since = self.since if since is None else since
+        failed = [entry for entry in self.failures if entry[0] > since and pattern.search(entry[1].url)]
+        for entry in failed:
+            self.failures.remove(entry)
+        return [response for _, response in failed]
+
+
+def attach(page):
+    tracker = _trackers.get(page)
+    if tracker is None:
+        tracker = PageReadiness(page)
+        _trackers[page] = tracker
+    return tracker
+
+
+def register_readiness_actions(controller):
+    from browser_use.agent.views import ActionResult
+    from browser_use.agent.service import BrowserContext
+
+    # Timeouts are reported but never fail the action list: a page that is slow
+    # to become ready costs at most the timeout, like the fixed wait it replaces.
+
+    @controller.action('Wait until an element matching the CSS selector is attached or visible, up to timeout seconds')
+    async def wait_for_selector(browser: BrowserContext, selector: str, state: str = "visible", timeout: int = 20):
+        page = await browser.get_current_page()
+        started = time.monotonic()
+        if await attach(page).wait_for_selector(selector, state=state, timeout=timeout):
+            msg = f"🕒  '{selector}' is {state} after {time.monotonic() - started:.1f}s"
+        else:
+            msg = f"⚠️ '{selector}' was not {state} within {timeout}s"
+        print(msg)
+        return ActionResult(extracted_content=msg, include_in_memory=True)
+
+    @controller.action('Wait until the page has no network requests in flight, up to timeout seconds')
+    async def wait_for_network_idle(browser: BrowserContext, timeout: int = 20):
+        page = await browser.get_current_page()
+        started = time.monotonic()
+        if await attach(page).wait_for_network_idle(timeout=timeout):
+            msg = f"🕒  Network idle after {time.monotonic() - started:.1f}s"
+        else:
+            msg = f"⚠️ Network was still busy after {timeout}s"
+        print(msg)
+        return ActionResult(extracted_content=msg, include_in_memory=True)
+
+    @controller.action('Wait until a response whose URL matches the regex has arrived, up to timeout seconds')
+    async def wait_for_response(browser: BrowserContext, url_pattern: str, timeout: int = 20):
+        page = await browser.get_current_page()
+        started = time.monotonic()
+        response = await attach(page).wait_for_response(url_pattern, timeout=timeout)
+        if response is not None:
+            msg = f"🕒  Response [{response.status}] {response.url} after {time.monotonic() - started:.1f}s"
+        else:
+            msg = f"⚠️ No response matching '{url_pattern}' within {timeout}s"
+        print(msg)
+        return ActionResult(extracted_content=msg, include_in_memory=True)
+
+    return controller
@@ -0,0 +1,142 @@
+import argparse
+import os
+
+import pandas as pd
+
+# Hyphen, non-breaking hyphen, figure dash, en/em dash, horizontal bar, minus sign
+DASH_VARIANTS = "\u2010\u2011\u2012\u2013\u2014\u2015\u2212"
+DASH_TABLE = str.maketrans({dash: "-" for dash in DASH_VARIANTS})
+
+STATUS_UPDATED = "updated"
+STATUS_NOT_ON_PAGE = "not_on_page"
+STATUS_NOT_UPDATED = "not_updated"
+# Rows in the data and on the page, by fill outcome
+STATUS_ON_PAGE = "on_page"  # no fill report to say what happened
+STATUS_UNCHANGED = "unchanged"
+STATUS_NOT_EDITABLE = "not_editable"
+STATUS_NOT_PERSISTED = "not_persisted"
+STATUS_NOT_FILLED = "not_filled"
+
+# fill report key -> status; the first match wins
+FILL_OUTCOMES = [
+    ("not_persisted", STATUS_NOT_PERSISTED),
+    ("not_editable", STATUS_NOT_EDITABLE),
+    ("filled", STATUS_UPDATED),
+    ("unchanged", STATUS_UNCHANGED),
+]
+
+
+def normalize_service_names(names):
+    # "Mow with Rider - Warm Season" with an en dash, "mow with rider-warm  season" -> "mow with rider - warm season"
+    return (
+        names.astype(str)
+        .str.translate(DASH_TABLE)
+        .str.lower()
+        .str.replace(r"\s*-\s*", " - ", regex=True)
+        .str.split()
+        .str.join(" ")
+    )
+
+
+def index_by_name(df, name_column="serviceItemType"):
+    # Computes the match key once; the first row wins when a name repeats
+    keyed = df.assign(key=normalize_service_names(df[name_column]))
+    return keyed.drop_duplicates("key")
+
+
+def fill_statuses(keys, fill_report):
+    # Status of each matched row from the fill/save report (lists of item names per outcome)
+    statuses = pd.Series(STATUS_NOT_FILLED, index=keys.index)
+    for outcome, status in reversed(FILL_OUTCOMES):
+        names = set(normalize_service_names(pd.Series(fill_report.get(outcome, []), dtype=object)))
+        statuses[keys.isin(names)] = status
+    return statuses
+
+
+def reconcile(takeoff_df, page_df, property_id=None, fill_report=None):
+    # takeoff_df: serviceItemType, value (the CSV being filled)
+    # page_df: serviceType, serviceItemType, measurement[, value] (the extracted takeoff)
+    # fill_report: what the fill and Save did (see property_destination.fill_and_save_takeoff);
+    # without it rows found on both sides are only known to be on_page
+    wanted = index_by_name(takeoff_df[["serviceItemType", "value"]])
+    on_page = index_by_name(page_df).rename(columns={"serviceItemType": "pageServiceItemType", "value": "currentValue"})
+    on_page = on_page[[c for c in ["key", "serviceType", "pageServiceItemType", "measurement", "currentValue"] if c in on_page]]
+
+    report = wanted.merge(on_page, on="key", how="outer", indicator=True)
+    report["status"] = report["_merge"].map({
+        "both": STATUS_ON_PAGE,
+        "left_only": STATUS_NOT_ON_PAGE,
+        "right_only": STATUS_NOT_UPDATED,
+    }).astype(str)
+    if fill_report is not None:
+        matched = report["_merge"] == "both"
+        report.loc[matched, "status"] = fill_statuses(report.loc[matched, "key"], fill_report)
+    report["serviceItemType"] = report["serviceItemType"].fillna(report["pageServiceItemType"])
+    report.insert(0, "property_id", property_id)
+    return report.drop(columns="_merge")
+
+
+def reconcile_properties(jobs):
+    # jobs: iterable of (property_id, takeoff_df, page_df[, fill_report])
+    reports = [reconcile(job[1], job[2], job[0], *job[3:]) for job in jobs]
+    return pd.concat(reports, ignore_index=True) if reports else pd.DataFrame()
+
+
+def save_report(report, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if path.endswith(".json"):
+        report.to_json(path, orient="records", indent=2)
+    else:
+        report.to_csv(path, index=False)
+
+
+def summarize(report, max_items=10):
+    counts = report.groupby(["property_id", "status"], dropna=False).size().unstack(fill_value=0)
+    lines = ["🚀 Takeoff Data Upload Summary 🚀"]
+    for property_id, row in counts.iterrows():
+        name = f"Property {property_id}" if pd.notna(property_id) else "Takeoff"
+        line = (f"{name}: {row.get(STATUS_UPDATED, 0)} updated, "
+                f"{row.get(STATUS_NOT_ON_PAGE, 0)} not on the page, {row.get(STATUS_NOT_UPDATED, 0)} not updated")
+        for status, label in [(STATUS_ON_PAGE, "on the page"), (STATUS_UNCHANGED, "unchanged"),
+                              (STATUS_NOT_EDITABLE, "not editable"), (STATUS_NOT_PERSISTED, "not persisted"),
+                              (STATUS_NOT_FILLED, "not filled")]:
+            if row.get(status, 0):
+                line += f", {row[status]} {label}"
+        lines.append(line)
+
+    # Only a sample of names; the full list is in the saved report
+    for status, label in [(STATUS_NOT_ON_PAGE, "In takeoff data but NOT on the page"),
+                          (STATUS_NOT_UPDATED, "On the page but not updated"),
+                          (STATUS_NOT_PERSISTED, "Saved but Aspire kept a different value"),
+                          (STATUS_NOT_EDITABLE, "On the page but not editable"),
+                          (STATUS_NOT_FILLED, "On the page but the fill did not reach it")]:
+        names = report.loc[report["status"] == status, "serviceItemType"].drop_duplicates()
+        if len(names):
+            sample = ", ".join(names.head(max_items))
+            more = f" (+{len(names) - max_items} more)" if len(names) > max_items else ""
+            lines.append(f"{label}: {sample}{more}")
+    return "\n".join(lines)
+
+
+def cli(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Reconcile takeoff CSVs against extracted takeoff service items.")
+    parser.add_argument("takeoff_csv", help="Takeoff data that was filled (serviceItemType, value)")
+    parser.add_argument("service_items", help="Extracted service items (CSV or Parquet)")
+    parser.add_argument("--property-id")
+    parser.add_argument("--output", default="takeoff_reconciliation.csv", help=".csv or .json")
+    args = parser.parse_args(argv)
+
+    takeoff_df = pd.read_csv(args.takeoff_csv)
+    if args.service_items.endswith(".parquet"):
+        page_df = pd.read_parquet(args.service_items)
+    else:
+        page_df = pd.read_csv(args.service_items)
+
+    report = reconcile(takeoff_df, page_df, args.property_id)
+    save_report(report, args.output)
+    print(summarize(report))
+    print(f"✅ Reconciliation saved to {args.output}")
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Analytics, chat widgets and session recorders the Aspire SPA pulls in but the
+# automation never needs
+DEFAULT_BLOCKED_DOMAINS = (
+    "google-analytics.com,googletagmanager.com,doubleclick.net,hotjar.com,segment.io,segment.com,"
+    "intercom.io,intercomcdn.com,fullstory.com,newrelic.com,nr-data.net,clarity.ms,pendo.io,walkme.com"
+)
+
+# Build tools put a content hash in the file name (main.3f2a9c1b.js, styles-9b1e0c.css);
+# such a URL never changes content, so it is served from disk without asking the server
+HASHED_BUNDLE = re.compile(r"[.-][0-9a-f]{6,}(\.chunk)?\.(js|css)$", re.IGNORECASE)
+
+# The cached body is stored decoded, so length/encoding headers no longer apply
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "set-cookie", "date"}
+
+
+def _env_list(name, default):
+    value = os.getenv(name, default)
+    return [v.strip().lower() for v in value.split(",") if v.strip()]
+
+
+class ResourceRouter:
+
+    # Routes every request of a Playwright context: aborts non-essential resource
+    # types and domains, and keeps script/stylesheet bundles in a disk cache keyed
+    # by URL and revalidated with their ETag. Routing turns off Chromium's own HTTP
+    # cache, so without the disk cache every bundle would be downloaded again.
+    def __init__(self, blocked_types=None, blocked_domains=None, cache_dir=None, cached_types=None):
+        self.enabled = os.getenv('ASPIRE_RESOURCE_ROUTING', 'on').lower() not in ("0", "off", "false")
+        self.blocked_types = set(blocked_types or _env_list('ASPIRE_BLOCK_RESOURCE_TYPES', 'image,media,font'))
+        self.blocked_domains = blocked_domains or _env_list('ASPIRE_BLOCK_DOMAINS', DEFAULT_BLOCKED_DOMAINS)
+        self.cache_dir = cache_dir or os.getenv('ASPIRE_STATIC_CACHE_DIR', os.path.join(".cache", "static"))
+        self.cached_types = set(cached_types or ("script", "stylesheet"))
+        self.stats = Counter()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    async def attach(self, context):
+        if self.enabled:
+            await context.route("**/*", self._handle)
+
+    def _is_blocked(self, request):
+        if request.resource_type in self.blocked_types:
+            return True
+        host = urlparse(request.url).hostname or ""
+        return any(host == domain or host.endswith("." + domain) for domain in self.blocked_domains)
+
+    async def _handle(self, route):
+        request = route.request
+        try:
+            if self._is_blocked(request):
+                self.stats["blocked"] += 1
+                await route.abort()
+            elif request.method == "GET" and request.resource_type in self.cached_types:
+                await self._serve_cached(route)
+            else:
+                await route.continue_()
+        except Exception as e:
+            # e.g. route.fetch() hit a network error: let the browser load it itself, or
+            # the request would stay pending and the page (and network idle) never settle
+            print(f"⚠️ Routing failed for {request.url}: {e}")
+            try:
+                await route.continue_()
+            except Exception:
+                # Already handled, or the page or context closed while it was in flight
+                pass
+
+    # === Disk cache ===
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json"), os.path.join(self.cache_dir, f"{key}.body")
+
+    def _read(self, url):
+        meta_path, body_path = self._paths(url)
+        if not os.path.exists(meta_path) or not os.path.exists(body_path):
+            return None, None
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def _write(self, url, headers, body):
+        meta_path, body_path = self._paths(url)
+        for path, data, mode in ((body_path, body, "wb"), (meta_path, json.dumps({"url": url, "headers": headers}), "w")):
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, mode) as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+    async def _serve_cached(self, route):
+        url = route.request.url
+        meta, body = await asyncio.to_thread(self._read, url)
+        if meta is not None:
+            etag = meta["headers"].get("etag")
+            if HASHED_BUNDLE.search(urlparse(url).path) or "immutable" in meta["headers"].get("cache-control", ""):
+                self.stats["cache_hit"] += 1
+                await route.fulfill(status=200, headers=meta["headers"], body=body)
+                return
+            if etag:
+                response = await route.fetch(headers={**route.request.headers, "if-none-match": etag})
+                if response.status == 304:
+                    self.stats["revalidated"] += 1
+                    await route.fulfill(status=200, headers=meta["headers"], body=body)
+                    return
+                await self._store_and_fulfill(route, response)
+                return
+
+        await self._store_and_fulfill(route, await route.fetch())
+
+    async def _store_and_fulfill(self, route, response):
+        self.stats["fetched"] += 1
+        url = route.request.url
+        if response.status == 200 and ("etag" in response.headers or HASHED_BUNDLE.search(urlparse(url).path)):
+            body = await response.body()
+            headers = {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_HEADERS}
+            await asyncio.to_thread(self._write, url, headers, body)
+            await route.fulfill(status=200, headers=headers, body=body)
+            return
+        await route.fulfill(response=response)
+
+    def format_stats(self):
+        return (f"Resource routing: {self.stats['blocked']} blocked, {self.stats['cache_hit']} served from disk, "
+                f"{self.stats['revalidated']} revalidated, {self.stats['fetched']} fetched")
@@ -0,0 +1,103 @@
+import asyncio
+import json
+
+from browser_use.agent.views import ActionResult
+
+from readiness import attach as attach_readiness
+from tracing import tracer
+
+# Actions after which the clickable elements are unchanged, so the selector map
+# from before them is still good for the next index-based action
+DOM_PRESERVING_ACTIONS = {"input_text"}
+
+
+class ScriptedExecutor:
+
+    # Runs initial-action dictionaries ({"go_to_url": {...}}, {"click_element": {...}}, ...)
+    # through the controller directly, the same way Agent.multi_act does, but without
+    # an Agent and therefore without any LLM call.
+    def __init__(self, controller, browser_context, available_file_paths=None, sensitive_data=None):
+        self.controller = controller
+        self.browser_context = browser_context
+        self.available_file_paths = available_file_paths
+        self.sensitive_data = sensitive_data
+        self.ActionModel = controller.registry.create_action_model()
+
+    def to_action_model(self, action):
+        name = next(iter(action))
+        param_model = self.controller.registry.registry.actions[name].param_model
+        return self.ActionModel(**{name: param_model(**action[name])})
+
+    async def run(self, actions):
+        # Returns (None, results) when every action succeeded, otherwise
+        # (index of the failed action, results so far)
+        results = []
+        previous = None
+        for i, action in enumerate(actions):
+            name = next(iter(action))
+            with tracer.span(f"scripted.{name}", step=i + 1) as span:
+                try:
+                    model = self.to_action_model(action)
+                    if not name.startswith("wait_for"):
+                        # Later waits only match responses this action triggers
+                        attach_readiness(await self.browser_context.get_current_page()).mark()
+                    if model.get_index() is not None and previous not in DOM_PRESERVING_ACTIONS:
+                        await self.browser_context.get_state()
+                    result = await self.controller.act(
+                        model,
+                        self.browser_context,
+                        sensitive_data=self.sensitive_data,
+                        available_file_paths=self.available_file_paths,
+                    )
+                except Exception as e:
+                    result = ActionResult(error=str(e), include_in_memory=True)
+                if result.error:
+                    span["status"] = "error"
+
+            results.append(result)
+            if result.error:
+                print(f"❌ Scripted step {i + 1}/{len(actions)} ({name}) failed: {result.error}")
+                return i, results
+            previous = name
+            await asyncio.sleep(self.browser_context.config.wait_between_actions)
+
+        print(f"✅ Ran {len(actions)} scripted steps without the agent")
+        return None, results
+
+
+def describe_actions(actions, sensitive_data=None):
+    # Step list for the fallback agent; secrets are replaced by <secret> placeholders
+    # that the Agent substitutes back only when it types them
+    lines = []
+    for i, action in enumerate(actions, start=1):
+        text = json.dumps(action)
+        for placeholder, value in (sensitive_data or {}).items():
+            if value:
+                text = text.replace(json.dumps(value)[1:-1], f"<secret>{placeholder}</secret>")
+        lines.append(f"{i}. {text}")
+    return "\n".join(lines)
+
+
+def fallback_task(goal, actions, failed_at, results, sensitive_data=None):
+    error = results[-1].error if results else "unknown error"
+    return (
+        f"{goal}\n"
+        f"A scripted sequence of browser actions stopped at the step below with the error: {error}\n"
+        f"Element indexes in these steps may be stale; find the intended elements on the current page.\n"
+        f"Complete the remaining steps, then finish:\n"
+        f"{describe_actions(actions[failed_at:], sensitive_data)}"
+    )
+
+
+async def run_scripted(actions, controller, browser_context, goal, agent_factory, available_file_paths=None, sensitive_data=None):
+    # Deterministic steps first; the agent is only created if one of them fails
+    executor = ScriptedExecutor(controller, browser_context, available_file_paths=available_file_paths, sensitive_data=sensitive_data)
+    failed_at, results = await executor.run(actions)
+    if failed_at is None:
+        return None
+
+    print("🤖 Handing the remaining steps to the agent")
+    tracer.count("agent_fallbacks")
+    agent = agent_factory(fallback_task(goal, actions, failed_at, results, sensitive_data))
+    with tracer.span("agent.fallback"):
+        return await agent.run()
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import time
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Runs on every navigation; restores localStorage once per tab so that tokens the
+# app refreshes later in the session are never overwritten by the cached ones.
+RESTORE_LOCAL_STORAGE_SCRIPT = """
+(() => {
+    const origins = %s;
+    const items = origins[window.location.origin];
+    if (!items || sessionStorage.getItem('__session_cache_restored')) return;
+    for (const item of items) localStorage.setItem(item.name, item.value);
+    sessionStorage.setItem('__session_cache_restored', '1');
+})();
+"""
+
+
+class SessionCache:
+
+    def __init__(self, name=None):
+        self.login_url = os.getenv('ASPIRE_LOGIN_URL') or ""
+        # Paths an expired session is redirected to; the login URL's own path by default
+        login_paths = os.getenv('ASPIRE_LOGIN_PATHS') or urlparse(self.login_url).path
+        self.login_paths = {self._normalize_path(path) for path in login_paths.split(",")}
+        self.max_age_seconds = int(os.getenv('ASPIRE_SESSION_MAX_AGE_SECONDS', 8 * 60 * 60))
+        self.validation_timeout = int(os.getenv('ASPIRE_SESSION_VALIDATION_TIMEOUT_SECONDS', 20))
+        cache_dir = os.getenv('ASPIRE_SESSION_CACHE_DIR', os.path.join(".cache", "sessions"))
+
+        # One cache file per login, so different accounts never share cookies
+        if name is None:
+            account = f"{self.login_url}|{os.getenv('ASPIRE_LOGIN_EMAIL', '')}"
+            name = hashlib.sha256(account.encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(cache_dir, f"aspire_session_{name}.json")
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable session cache {self.path}: {e}")
+            return None
+
+        if time.time() - state.get("saved_at", 0) > self.max_age_seconds:
+            print("⌛ Cached Aspire session is older than the allowed age, logging in again.")
+            return None
+
+        # Drop cookies that have already expired (-1 means session cookie)
+        now = time.time()
+        state["cookies"] = [c for c in state.get("cookies", []) if c.get("expires", -1) < 0 or c["expires"] > now]
+        if not state["cookies"] and not state.get("origins"):
+            return None
+        return state
+
+    async def restore(self, browser_context):
+        state = self.load()
+        if state is None:
+            return False
+
+        session = await browser_context.get_session()
+        if state["cookies"]:
+            await session.context.add_cookies(state["cookies"])
+
+        origins = {o["origin"]: o.get("localStorage", []) for o in state.get("origins", [])}
+        if origins:
+            await session.context.add_init_script(RESTORE_LOCAL_STORAGE_SCRIPT % json.dumps(origins))
+
+        print(f"🔑 Restored cached Aspire session ({len(state['cookies'])} cookies, {len(origins)} origins).")
+        return True
+
+    async def save(self, browser_context):
+        session = await browser_context.get_session()
+        page = await browser_context.get_current_page()
+        if self.is_login_page(page.url):
+            print("⚠️ Not caching the Aspire session: still on the login page.")
+            return
+
+        state = await session.context.storage_state()
+        state["saved_at"] = time.time()
+
+        # Write atomically and owner-only; the file holds live credentials
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+        print(f"💾 Saved Aspire session to {self.path}")
+
+    def invalidate(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @staticmethod
+    def _normalize_path(path):
+        return path.strip().rstrip("/").lower()
+
+    def is_login_page(self, url):
+        # Exact path match: "/login" is not "/login-history", and a login URL at the
+        # host root does not make every page on the host a login page
+        if not self.login_url:
+            return False
+        current = urlparse(url)
+        return current.netloc == urlparse(self.login_url).netloc and self._normalize_path(current.path) in self.login_paths
+
+    async def is_valid(self, page, url):
+        # Navigate to the target page; an expired session gets redirected to login
+        try:
+            await page.goto(url, wait_until="domcontentloaded")
+            await page.wait_for_load_state("networkidle", timeout=self.validation_timeout * 1000)
+        except Exception as e:
+            print(f"⚠️ Session validation did not settle: {e}")
+
+        if self.is_login_page(page.url):
+            print("⌛ Cached Aspire session has expired, logging in again.")
+            await page.context.clear_cookies()
+            self.invalidate()
+            return False
+
+        print("✅ Cached Aspire session is valid, skipping login.")
+        return True
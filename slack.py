@@ -1,25 +1,163 @@
+import asyncio
+import atexit
 import os
-import requests
+import threading
 
+import httpx
 from dotenv import load_dotenv
 
+from tracing import tracer
+
 load_dotenv()
 
 class Slack:
 
-    def __init__(self):
+    def __init__(self, batch_window=1.0, max_batch_chars=3500, max_retries=5):
         self.token = os.getenv('SLACK_TOKEN')
         self.channel = os.getenv('SLACK_CHANNEL')
         self.slack_post_message_url = os.getenv('SLACK_POST_MESSAGE_URL')
-    
+
+        self.batch_window = batch_window
+        self.max_batch_chars = max_batch_chars
+        self.max_retries = max_retries
+
+        # Messages are posted from a background thread with its own event loop,
+        # so callers (including running coroutines) never wait on Slack
+        self._lock = threading.Lock()
+        self._thread = None
+        self._loop = None
+        self._queue = None
+        atexit.register(self.close)
+
     def sendMessageToChannel(self, message):
+        # Never raises: Slack must not be able to break the flow that reports to it
+        tracer.count("slack_messages")
+        try:
+            loop, queue = self._start()
+            loop.call_soon_threadsafe(queue.put_nowait, message)
+        except Exception as e:
+            print(f"⚠️ Slack notifier unavailable ({e}), dropping message: {message}")
+
+    def close(self, timeout=10):
+        # Flush queued messages and stop the sender
+        with self._lock:
+            thread, loop, queue = self._thread, self._loop, self._queue
+            self._thread = None
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+        except RuntimeError:
+            # The sender stopped between the check and the call
+            return
+        thread.join(timeout)
+        if thread.is_alive():
+            print("⚠️ Slack notifier did not flush all messages before shutdown")
+
+    async def aclose(self, timeout=10):
+        await asyncio.to_thread(self.close, timeout)
+
+    def _start(self):
+        # Returns the sender's (loop, queue), starting it again if it died
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return self._loop, self._queue
+            if self._thread is not None:
+                print("⚠️ Slack notifier stopped unexpectedly, restarting it")
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(ready,), name="slack-notifier", daemon=True)
+            self._thread.start()
+            ready.wait()
+            return self._loop, self._queue
 
+    def _run(self, ready):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        ready.set()
+        try:
+            self._loop.run_until_complete(self._worker())
+        finally:
+            self._loop.close()
+
+    async def _worker(self):
         headers = {"Authorization": f"Bearer {self.token}", "Content-Type": "application/json; charset=utf-8"}
-        payload = {"channel": self.channel, "text": message}
+        async with httpx.AsyncClient(headers=headers, timeout=10) as client:
+            closing = False
+            while not closing:
+                message = await self._queue.get()
+                if message is None:
+                    break
+
+                # Coalesce a burst of progress messages into as few posts as possible
+                batch = [message]
+                deadline = self._loop.time() + self.batch_window
+                while True:
+                    remaining = deadline - self._loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        message = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                    if message is None:
+                        closing = True
+                        break
+                    batch.append(message)
+
+                for text in self._join_batch(batch):
+                    try:
+                        with tracer.span("slack.post", messages=len(batch)):
+                            await self._post(client, text)
+                    except Exception as e:
+                        # Drop this post, keep the sender alive for the next ones
+                        print(f"⚠️ Failed to send Slack message ({e}): {text}")
+
+    def _join_batch(self, batch):
+        texts = []
+        current = ""
+        for message in batch:
+            message = str(message)
+            if current and len(current) + len(message) + 1 > self.max_batch_chars:
+                texts.append(current)
+                current = message
+            else:
+                current = f"{current}\n{message}" if current else message
+        if current:
+            texts.append(current)
+        return texts
+
+    async def _post(self, client, text):
+        if not self.slack_post_message_url:
+            print(f"Slack is not configured, skipping message: {text}")
+            return
+
+        payload = {"channel": self.channel, "text": text}
+        delay = 1
+        for attempt in range(self.max_retries):
+            try:
+                response = await client.post(self.slack_post_message_url, json=payload)
+            except httpx.HTTPError as e:
+                print(f"⚠️ Slack request failed ({e}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+                delay *= 2
+                continue
+
+            try:
+                body = response.json() if response.headers.get("content-type", "").startswith("application/json") else {}
+            except ValueError:
+                body = {}
+            if response.status_code == 429 or body.get("error") == "ratelimited":
+                retry_after = int(response.headers.get("Retry-After", delay))
+                print(f"⚠️ Slack rate limited, retrying in {retry_after}s")
+                await asyncio.sleep(retry_after)
+                delay *= 2
+                continue
 
-        response = requests.post(self.slack_post_message_url, headers=headers, json=payload)
+            if response.status_code == 200 and body.get("ok"):
+                print("Message sent successfully!")
+            else:
+                print(f"Failed to send message: {response.text}")
+            return
 
-        if response.status_code == 200 and response.json().get("ok"):
-            print("Message sent successfully!")
-        else:
-            print(f"Failed to send message: {response.text}")
\ No newline at end of file
+        print(f"Failed to send message after {self.max_retries} attempts: {text}")
@@ -0,0 +1,370 @@
+import asyncio
+import importlib.util
+import re
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from checkpoint import backoff_delay
+from readiness import attach as attach_readiness
+from tracing import tracer
+
+TAKEOFF_ROW_SELECTOR = "tr.ng-star-inserted"
+TAKEOFF_INPUT_SELECTOR = "input.e-control.e-numerictextbox"
+TAKEOFF_TOGGLER_SELECTOR = "button.p-treetable-toggler"
+TAKEOFF_SAVE_SELECTOR = "button.p-button-success:has-text('Save')"
+
+# Reads every treetable row in one evaluation. The toggler's margin-left gives
+# the tree level (0px for a service type, indented for its service items); rows
+# without a margin are not part of the tree.
+EXTRACT_SCRIPT = """
+([rowSelector, inputSelector, togglerSelector]) => {
+    const normalize = (text) => (text || '').replace(/\\s+/g, ' ').trim();
+    return Array.from(document.querySelectorAll(rowSelector)).map((row) => {
+        const cells = row.querySelectorAll('td');
+        const toggler = row.querySelector(togglerSelector);
+        const margin = toggler && toggler.style.marginLeft ? parseFloat(toggler.style.marginLeft) : null;
+        const input = row.querySelector(inputSelector);
+        return {
+            name: normalize(cells[0] && cells[0].textContent),
+            measurement: normalize(cells[1] && cells[1].textContent),
+            margin: margin,
+            value: input ? input.value : null,
+        };
+    });
+}
+"""
+
+# Indexes every treetable row once, then writes a batch of values in place.
+# Rows are matched on the first cell's text, falling back to the same
+# case-insensitive "row contains text" match as locator.filter(has_text=...).
+# The Syncfusion numeric textbox only commits its model on focus/input/change/blur,
+# so those are fired the same way a user typing and tabbing away would.
+BULK_FILL_SCRIPT = """
+([rowSelector, inputSelector, items]) => {
+    const normalize = (text) => (text || '').replace(/\\s+/g, ' ').trim();
+    const rows = Array.from(document.querySelectorAll(rowSelector));
+    const rowTexts = rows.map((row) => normalize(row.textContent).toLowerCase());
+    const byName = new Map();
+    rows.forEach((row, i) => {
+        const name = normalize(row.querySelector('td') && row.querySelector('td').textContent);
+        if (name && !byName.has(name)) byName.set(name, i);
+    });
+
+    const isVisible = (el) => {
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0 && getComputedStyle(el).visibility !== 'hidden';
+    };
+    const setValue = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set;
+
+    const report = { filled: [], missing: [], not_editable: [] };
+    for (const item of items) {
+        const name = normalize(item.name);
+        let i = byName.get(name);
+        if (i === undefined) i = rowTexts.findIndex((text) => text.includes(name.toLowerCase()));
+        if (i === -1) {
+            report.missing.push(item.name);
+            continue;
+        }
+
+        const input = Array.from(rows[i].querySelectorAll(inputSelector)).find(isVisible);
+        if (!input || input.disabled || input.readOnly) {
+            report.not_editable.push(item.name);
+            continue;
+        }
+
+        input.focus();
+        setValue.call(input, item.value);
+        input.dispatchEvent(new Event('input', { bubbles: true }));
+        input.dispatchEvent(new Event('change', { bubbles: true }));
+        input.blur();
+        report.filled.push(item.name);
+    }
+    return report;
+}
+"""
+
+
+def takeoff_items(df):
+    return [
+        {"name": str(service_name).strip(), "value": str(value)}
+        for service_name, value in zip(df["serviceItemType"], df["value"])
+    ]
+
+
+async def bulk_fill_takeoff(page, df, chunk_size=250):
+    items = takeoff_items(df)
+    report = {"filled": [], "missing": [], "not_editable": []}
+
+    # A few large batches keep round-trips low while giving Angular a chance to
+    # run change detection between them
+    for start in range(0, len(items), chunk_size):
+        chunk = items[start:start + chunk_size]
+        with tracer.span("takeoff.fill_chunk", rows=len(chunk)):
+            result = await page.evaluate(BULK_FILL_SCRIPT, [TAKEOFF_ROW_SELECTOR, TAKEOFF_INPUT_SELECTOR, chunk])
+        tracer.count("takeoff_rows_filled", len(result["filled"]))
+        for key in report:
+            report[key].extend(result[key])
+        print(f"Filled {start + len(chunk)}/{len(items)} takeoff items")
+
+    return report
+
+
+async def fill_takeoff_rows(page, df, settle_ms=3000):
+    # One locator round-trip per row; kept for pages where the bulk script misbehaves.
+    # After each row it waits for the recalculation traffic to go quiet, at most settle_ms.
+    report = {"filled": [], "missing": [], "not_editable": []}
+    readiness = attach_readiness(page)
+
+    for item in takeoff_items(df):
+        service_name = item["name"]
+        value = item["value"]
+
+        print(f"Processing: {service_name} -> {value}")
+        with tracer.span("takeoff.fill_row"):
+            row = page.locator(TAKEOFF_ROW_SELECTOR).filter(has_text=service_name)
+            input_fields = await row.locator(TAKEOFF_INPUT_SELECTOR).all()
+            if not input_fields:
+                report["missing"].append(service_name)
+                continue
+
+            for input_field in input_fields:
+                if await input_field.is_visible():
+                    await input_field.clear()
+                    await input_field.fill(value)
+                    await input_field.press("Tab")
+                    print(f"Entered {value} for '{service_name}'")
+                    report["filled"].append(service_name)
+                    tracer.count("takeoff_rows_filled")
+                    break
+            else:
+                report["not_editable"].append(service_name)
+
+        await readiness.wait_for_network_idle(timeout=settle_ms / 1000, idle_time=0.2)
+
+    return report
+
+
+def format_fill_report(report):
+    lines = [f"Filled {len(report['filled'])} takeoff items."]
+    if report.get("unchanged"):
+        lines.append(f"Already up to date ({len(report['unchanged'])}), not written.")
+    if report["missing"]:
+        lines.append(f"Not found on the page ({len(report['missing'])}): " + ", ".join(report["missing"]))
+    if report["not_editable"]:
+        lines.append(f"No editable input ({len(report['not_editable'])}): " + ", ".join(report["not_editable"]))
+    if report.get("confirmed") or report.get("unverified"):
+        lines.append(f"Saved: {len(report.get('confirmed', []))} confirmed by Aspire, "
+                     f"{len(report.get('unverified', []))} not in its response.")
+    if report.get("not_persisted"):
+        lines.append(f"Saved with a different value ({len(report['not_persisted'])}): " + ", ".join(report["not_persisted"]))
+    return "\n".join(lines)
+
+
+# === Saving ===
+def verify_saved_values(document, items, tolerance=1e-6):
+    # Compares the takeoff Aspire returned from Save with the values written.
+    # Returns (confirmed, not_persisted, unverified) lists of item names.
+    from aspire_api import iter_takeoff_items, normalize_name
+
+    saved = {}
+    for item, name_key, value_key in iter_takeoff_items(document):
+        saved.setdefault(normalize_name(item[name_key]), item[value_key])
+
+    confirmed, not_persisted, unverified = [], [], []
+    for name, value in items.items():
+        key = normalize_name(name)
+        wanted = parse_value(value)
+        if key not in saved or wanted is None:
+            # Not in the response, or a value that can't be compared as a number
+            unverified.append(name)
+            continue
+        stored = parse_value(saved[key])
+        if stored is not None and abs(stored - wanted) <= tolerance:
+            confirmed.append(name)
+        else:
+            not_persisted.append(name)
+    return confirmed, not_persisted, unverified
+
+
+async def save_takeoff(page, items, save_pattern="takeoff", recalc_pattern="recalc", timeout=30, enable_timeout=3, since=None):
+    # Clicks Save and returns as soon as Aspire answers the save request, with the
+    # written items ({name: value}) checked against the takeoff in its response.
+    # Failed recalculations (after the readiness marker since, e.g. taken before the
+    # fill) or a non-2xx save raise instead of reporting success.
+    readiness = attach_readiness(page)
+    save_regex = re.compile(save_pattern, re.IGNORECASE)
+    recalc_regex = re.compile(recalc_pattern, re.IGNORECASE)
+
+    def is_save(response):
+        return (response.request.method in ("PUT", "POST", "PATCH") and save_regex.search(response.url)
+                and not recalc_regex.search(response.url))
+
+    with tracer.span("takeoff.save", rows=len(items)) as span:
+        # Let the recalculation requests triggered by the new values finish
+        await readiness.wait_for_network_idle(timeout=10)
+        failed = readiness.take_failures(recalc_pattern, since=since)
+        if failed:
+            raise RuntimeError(f"Takeoff recalculation failed [{failed[-1].status}] {failed[-1].url}")
+
+        # Aspire only enables Save when a value actually changed, and Angular may enable it
+        # a moment after the last input event
+        save_button = page.locator(TAKEOFF_SAVE_SELECTOR).first
+        deadline = asyncio.get_running_loop().time() + enable_timeout
+        while await save_button.is_disabled() and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.25)
+        if await save_button.is_disabled():
+            # Nothing to save only if the page already shows every written value; otherwise
+            # the writes never reached the form model and the caller has to retry
+            current = takeoff_to_dataframe(await extract_takeoff(page))
+            written = pd.DataFrame({"serviceItemType": list(items), "value": list(items.values())})
+            differing, unchanged = diff_takeoff(written, current)
+            if len(differing):
+                names = ", ".join(differing["serviceItemType"].astype(str).head(5))
+                raise RuntimeError(f"Save stayed disabled but {len(differing)} takeoff items don't show the written value ({names})")
+            span["attributes"]["status"] = "unchanged"
+            print(f"✅ Save stayed disabled: the takeoff already holds these {len(items)} values")
+            return {"status": None, "confirmed": [], "not_persisted": [], "unverified": [], "unchanged": unchanged}
+
+        async with page.expect_response(is_save, timeout=timeout * 1000) as response_info:
+            await save_button.click()
+        response = await response_info.value
+        span["attributes"]["status"] = response.status
+        if not response.ok:
+            raise RuntimeError(f"Takeoff save was rejected [{response.status}]: {(await response.text())[:200]}")
+
+        try:
+            document = await response.json()
+        except Exception:
+            document = None
+        confirmed, not_persisted, unverified = verify_saved_values(document, items)
+
+    tracer.count("takeoff_rows_confirmed", len(confirmed))
+    print(f"✅ Takeoff saved [{response.status}]: {len(confirmed)} items confirmed, "
+          f"{len(not_persisted)} with a different value, {len(unverified)} not in the response")
+    return {"status": response.status, "confirmed": confirmed, "not_persisted": not_persisted, "unverified": unverified}
+
+
+# === Extraction ===
+@dataclass
+class ServiceItem:
+    service_item_type: str
+    measurement: str
+    value: float | None
+
+
+@dataclass
+class ServiceType:
+    name: str
+    items: list[ServiceItem] = field(default_factory=list)
+
+
+def parse_value(text):
+    # The numeric textbox shows formatted numbers such as "1,200.00"
+    if text is None:
+        return None
+    try:
+        return float(str(text).replace(",", "").strip())
+    except ValueError:
+        return None
+
+
+def build_takeoff_tree(rows):
+    tree = []
+    for row in rows:
+        if row["margin"] is None:
+            continue
+        if row["margin"] == 0:
+            tree.append(ServiceType(name=row["name"]))
+        elif tree:
+            tree[-1].items.append(ServiceItem(row["name"], row["measurement"], parse_value(row["value"])))
+    return tree
+
+
+async def extract_takeoff(page):
+    with tracer.span("takeoff.extract"):
+        rows = await page.evaluate(EXTRACT_SCRIPT, [TAKEOFF_ROW_SELECTOR, TAKEOFF_INPUT_SELECTOR, TAKEOFF_TOGGLER_SELECTOR])
+    return build_takeoff_tree(rows)
+
+
+def takeoff_to_dataframe(tree):
+    records = [
+        (service_type.name, item.service_item_type, item.measurement, item.value)
+        for service_type in tree
+        for item in service_type.items
+    ]
+    return pd.DataFrame.from_records(records, columns=["serviceType", "serviceItemType", "measurement", "value"])
+
+
+def parquet_available():
+    return any(importlib.util.find_spec(engine) is not None for engine in ("pyarrow", "fastparquet"))
+
+
+def save_takeoff_snapshot(df, path):
+    # Returns the path written; .parquet falls back to .csv when no Parquet engine is installed
+    if path.endswith(".parquet"):
+        if parquet_available():
+            df.to_parquet(path, index=False)
+            return path
+        csv_path = f"{path[:-len('.parquet')]}.csv"
+        print(f"⚠️ pyarrow/fastparquet not installed, saving the takeoff snapshot as {csv_path} instead")
+        path = csv_path
+    df.to_csv(path, index=False)
+    return path
+
+
+# === Incremental updates ===
+def normalize_item_names(names):
+    return names.astype(str).str.split().str.join(" ")
+
+
+def diff_takeoff(df, current, tolerance=1e-6):
+    # Returns (rows of df that need writing, names already holding the wanted value).
+    # Rows that don't match a page row exactly are kept for writing so the bulk
+    # script's fuzzy match still gets a chance to find them.
+    names = normalize_item_names(df["serviceItemType"])
+    on_page = (
+        current.assign(name=normalize_item_names(current["serviceItemType"]))
+        .drop_duplicates("name")
+        .set_index("name")["value"]
+    )
+    found = names.isin(on_page.index)
+    current_values = names.map(on_page)
+    wanted = pd.to_numeric(df["value"], errors="coerce")
+
+    unchanged = found & (((wanted - current_values).abs() <= tolerance) | (wanted.isna() & current_values.isna()))
+    return df[~unchanged], df.loc[unchanged, "serviceItemType"].astype(str).str.strip().tolist()
+
+
+async def incremental_fill_takeoff(page, df, chunk_size=250):
+    current = takeoff_to_dataframe(await extract_takeoff(page))
+    to_write, unchanged = diff_takeoff(df, current)
+    print(f"{len(to_write)} takeoff items changed, {len(unchanged)} unchanged")
+
+    report = {"filled": [], "missing": [], "not_editable": []}
+    if len(to_write):
+        report = await bulk_fill_takeoff(page, to_write, chunk_size=chunk_size)
+    report["unchanged"] = unchanged
+    return report
+
+
+# === Retries ===
+async def fill_with_retries(fill, page, df, attempts=2, base_delay=1.0):
+    # Rows the page had not rendered or enabled yet get another pass after a backoff;
+    # whatever still fails after the last attempt stays in the report
+    report = await fill(page, df)
+    for attempt in range(1, attempts):
+        failed = set(report["missing"]) | set(report["not_editable"])
+        if not failed:
+            break
+        delay = backoff_delay(attempt, base_delay)
+        print(f"🔁 Retrying {len(failed)} takeoff items in {delay:.1f}s")
+        tracer.count("takeoff_row_retries", len(failed))
+        await asyncio.sleep(delay)
+
+        retry = await fill(page, df[df["serviceItemType"].astype(str).str.strip().isin(failed)])
+        report["filled"].extend(retry["filled"])
+        report["missing"] = retry["missing"]
+        report["not_editable"] = retry["not_editable"]
+        report.setdefault("unchanged", []).extend(retry.get("unchanged", []))
+    return report
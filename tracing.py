@@ -0,0 +1,151 @@
+import contextvars
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Tracer:
+
+    # Collects timed spans and counters for one process. Spans nest per asyncio task
+    # (parent ids follow the context), and recording is thread-safe so the Slack
+    # sender thread can report into the same tracer.
+    def __init__(self, name):
+        self.name = name
+        self.started_at = time.time()
+        self.ids = itertools.count(1)
+        self.spans = []
+        self.counters = Counter()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        span = {"id": next(self.ids), "parent": _current_span.get(), "name": name, "attributes": attributes,
+                "start": time.time(), "status": "ok"}
+        token = _current_span.set(span["id"])
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span["status"] = "error"
+            span["attributes"]["error"] = str(e)
+            raise
+        finally:
+            span["seconds"] = time.perf_counter() - started
+            _current_span.reset(token)
+            with self.lock:
+                self.spans.append(span)
+
+    def reset(self):
+        # Starts a new window; long-running processes export and reset instead of
+        # keeping every span for their whole lifetime
+        with self.lock:
+            self.started_at = time.time()
+            self.spans = []
+            self.counters = Counter()
+
+    def add_span(self, name, start, seconds, **attributes):
+        # For work that was timed elsewhere, e.g. agent steps from the history
+        with self.lock:
+            self.spans.append({"id": next(self.ids), "parent": _current_span.get(), "name": name,
+                               "attributes": attributes, "start": start, "seconds": seconds, "status": "ok"})
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def record_agent_history(self, history):
+        if history is None:
+            return
+        self.count("agent_runs")
+        for item in history.history:
+            metadata = getattr(item, "metadata", None)
+            if metadata is None:
+                continue
+            tokens = getattr(metadata, "input_tokens", 0) or 0
+            self.add_span("agent.step", metadata.step_start_time, metadata.step_end_time - metadata.step_start_time,
+                          step=getattr(metadata, "step_number", None), input_tokens=tokens)
+        self.count("agent_steps", len(history.history))
+        self.count("llm_input_tokens", history.total_input_tokens())
+
+    # === Export ===
+    def summary(self):
+        stats = {}
+        with self.lock:
+            spans = list(self.spans)
+        for span in spans:
+            entry = stats.setdefault(span["name"], {"count": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            entry["count"] += 1
+            entry["errors"] += span["status"] == "error"
+            entry["total_seconds"] += span["seconds"]
+            entry["max_seconds"] = max(entry["max_seconds"], span["seconds"])
+        return stats
+
+    def to_json(self):
+        with self.lock:
+            return {"name": self.name, "started_at": self.started_at, "spans": list(self.spans), "counters": dict(self.counters)}
+
+    def to_prometheus(self):
+        summary = sorted(self.summary().items())
+        labels = {name: f'flow="{self.name}",span="{name}"' for name, _ in summary}
+        lines = [
+            "# HELP aspire_span_seconds Time spent in each stage of a run.",
+            "# TYPE aspire_span_seconds summary",
+        ]
+        for name, entry in summary:
+            lines.append(f"aspire_span_seconds_sum{{{labels[name]}}} {entry['total_seconds']:.6f}")
+            lines.append(f"aspire_span_seconds_count{{{labels[name]}}} {entry['count']}")
+        lines.append("# TYPE aspire_span_seconds_max gauge")
+        lines.extend(f"aspire_span_seconds_max{{{labels[name]}}} {entry['max_seconds']:.6f}" for name, entry in summary)
+        lines.append("# TYPE aspire_span_errors_total counter")
+        lines.extend(f"aspire_span_errors_total{{{labels[name]}}} {entry['errors']}" for name, entry in summary)
+
+        with self.lock:
+            counters = sorted(self.counters.items())
+        for name, value in counters:
+            metric = "aspire_" + re.sub(r"[^a-zA-Z0-9_]", "_", name) + "_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f'{metric}{{flow="{self.name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def format_summary(self, limit=10):
+        slowest = sorted(self.summary().items(), key=lambda kv: kv[1]["total_seconds"], reverse=True)[:limit]
+        lines = [f"⏱️ {self.name} timings:"]
+        for name, entry in slowest:
+            lines.append(f"  {name}: {entry['total_seconds']:.1f}s total over {entry['count']} (max {entry['max_seconds']:.1f}s)")
+        if self.counters.get("llm_input_tokens"):
+            lines.append(f"  LLM input tokens: {self.counters['llm_input_tokens']}"
+                         f" ({self.counters.get('llm_input_tokens_cached', 0)} answered from the cache)")
+        if self.counters.get("llm_cache_hits") or self.counters.get("llm_cache_misses"):
+            lines.append(f"  LLM cache: {self.counters['llm_cache_hits']} hits, {self.counters['llm_cache_misses']} misses")
+        if self.counters.get("dom_rows_deduplicated") or self.counters.get("dom_subtrees_pruned"):
+            lines.append(f"  DOM compaction: {self.counters['dom_rows_deduplicated']} rows deduplicated, "
+                         f"{self.counters['dom_subtrees_pruned']} subtrees pruned")
+        return "\n".join(lines)
+
+    def export(self, folder=None, stem=None):
+        folder = folder or os.getenv('ASPIRE_TIMING_DIR', os.path.join("logs", "timings"))
+        stem = stem or f"{self.name}_{time.strftime('%Y-%m-%d_%H:%M:%S', time.localtime(self.started_at))}"
+        os.makedirs(folder, exist_ok=True)
+        json_path = os.path.join(folder, f"{stem}.json")
+        with open(json_path, "w") as f:
+            json.dump(self.to_json(), f, indent=2, default=str)
+        with open(os.path.join(folder, f"{stem}.prom"), "w") as f:
+            f.write(self.to_prometheus())
+        print(self.format_summary())
+        print(f"✅ Timings saved to {json_path}")
+        return json_path
+
+
+# One tracer per process; flows rename it so the exported files say which flow ran
+tracer = Tracer("aspire")
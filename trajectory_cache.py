@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+from browser_use.agent.views import ActionResult
+from browser_use.dom.history_tree_processor.service import DOMHistoryElement, HistoryTreeProcessor
+
+from readiness import attach as attach_readiness
+from scripted_actions import ScriptedExecutor
+from tracing import tracer
+
+
+class TrajectoryCache:
+
+    # Records the actions of a successful agent run together with the element each
+    # one targeted (xpath, attributes, parent branch), and replays them later without
+    # the LLM. Indexes are re-resolved against the live page at every step.
+    def __init__(self, name, task, element_retries=3, retry_delay=1.0):
+        cache_dir = os.getenv('ASPIRE_TRAJECTORY_CACHE_DIR', os.path.join(".cache", "trajectories"))
+        key = hashlib.sha256(f"{name}|{task}".encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(cache_dir, f"{name}_{key}.json")
+        self.task = task
+        self.element_retries = element_retries
+        self.retry_delay = retry_delay
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path) as f:
+                return json.load(f)["steps"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Ignoring unreadable trajectory {self.path}: {e}")
+            return None
+
+    def save(self, steps):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"task": self.task, "saved_at": time.time(), "steps": steps}, f, indent=2)
+        os.replace(tmp_path, self.path)
+        print(f"💾 Recorded {len(steps)} agent steps to {self.path}")
+
+    def invalidate(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @staticmethod
+    def steps_from_history(history):
+        # Only actions that ran without error are worth replaying; "done" is implied
+        steps = []
+        for item in history.history:
+            if not item.model_output:
+                continue
+            for i, action in enumerate(item.model_output.action):
+                if i >= len(item.result) or item.result[i].error:
+                    break
+                dumped = action.model_dump(exclude_unset=True)
+                if not dumped or "done" in dumped:
+                    continue
+                element = item.state.interacted_element[i] if i < len(item.state.interacted_element) else None
+                steps.append({
+                    "action": dumped,
+                    "url": item.state.url,
+                    "element": None if element is None else {
+                        "tag_name": element.tag_name,
+                        "xpath": element.xpath,
+                        "entire_parent_branch_path": element.entire_parent_branch_path,
+                        "attributes": element.attributes,
+                        "shadow_root": element.shadow_root,
+                        "css_selector": element.css_selector,
+                    },
+                })
+        return steps
+
+    async def _resolve_index(self, browser_context, element):
+        recorded = DOMHistoryElement(
+            element["tag_name"],
+            element["xpath"],
+            None,
+            element["entire_parent_branch_path"],
+            element["attributes"],
+            element.get("shadow_root", False),
+            css_selector=element.get("css_selector"),
+        )
+        for attempt in range(self.element_retries):
+            state = await browser_context.get_state()
+            # CompactBrowserContext prunes rows from element_tree; match against the whole page
+            tree = getattr(state, "full_element_tree", state.element_tree)
+            node = HistoryTreeProcessor.find_history_element_in_tree(recorded, tree)
+            if node is not None and node.highlight_index is not None:
+                return node.highlight_index
+            await asyncio.sleep(self.retry_delay)
+        return None
+
+    async def replay(self, steps, controller, browser_context, available_file_paths=None, sensitive_data=None):
+        # Returns None when every step replayed, otherwise the index of the first
+        # step where the page no longer matches the recording
+        executor = ScriptedExecutor(controller, browser_context, available_file_paths=available_file_paths, sensitive_data=sensitive_data)
+        for i, step in enumerate(steps):
+            action = json.loads(json.dumps(step["action"]))
+            name = next(iter(action))
+
+            if step["element"] is not None:
+                index = await self._resolve_index(browser_context, step["element"])
+                if index is None:
+                    print(f"🔀 Replay diverged at step {i + 1}/{len(steps)} ({name}): recorded element not found")
+                    return i
+                action[name]["index"] = index
+
+            # The file to upload may differ between runs; use this run's file
+            path = action[name].get("path")
+            if path and available_file_paths and path not in available_file_paths and len(available_file_paths) == 1:
+                action[name]["path"] = available_file_paths[0]
+
+            try:
+                if not name.startswith("wait_for"):
+                    # Later waits only match responses this action triggers
+                    attach_readiness(await browser_context.get_current_page()).mark()
+                result = await controller.act(
+                    executor.to_action_model(action),
+                    browser_context,
+                    sensitive_data=sensitive_data,
+                    available_file_paths=available_file_paths,
+                )
+            except Exception as e:
+                result = ActionResult(error=str(e))
+            if result.error:
+                print(f"🔀 Replay diverged at step {i + 1}/{len(steps)} ({name}): {result.error}")
+                return i
+            await asyncio.sleep(browser_context.config.wait_between_actions)
+
+        print(f"✅ Replayed {len(steps)} recorded steps with no model calls")
+        return None
+
+
+def continue_task(task, done_steps):
+    done = "\n".join(f"- {json.dumps(step['action'])}" for step in done_steps)
+    return (
+        f"{task}\n"
+        f"These actions from the task above have already been carried out successfully:\n{done}\n"
+        f"Continue from the current page with the remaining part of the task."
+    )
+
+
+async def run_with_trajectory_cache(cache, task, make_agent, controller, browser_context, available_file_paths=None, sensitive_data=None):
+    # make_agent(task) builds the LLM agent; it is only called when there is no
+    # recording yet or the page diverged from it
+    steps = cache.load()
+    done_steps = []
+    if steps:
+        with tracer.span("trajectory.replay", steps=len(steps)) as span:
+            diverged_at = await cache.replay(steps, controller, browser_context, available_file_paths, sensitive_data)
+            span["attributes"]["diverged_at"] = diverged_at
+        if diverged_at is None:
+            tracer.count("trajectory_replays")
+            return None
+        done_steps = steps[:diverged_at]
+        task = continue_task(task, done_steps) if done_steps else task
+
+    with tracer.span("agent.run"):
+        history = await make_agent(task).run()
+    if history.is_done() and history.is_successful() is not False:
+        cache.save(done_steps + TrajectoryCache.steps_from_history(history))
+    else:
+        cache.invalidate()
+    return history
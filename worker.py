@@ -0,0 +1,327 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sqlite3
+import statistics
+import threading
+import time
+
+from clients import get_browser, get_slack
+from estimation_destination import (
+    get_network_trace as get_estimation_trace,
+    prepare_estimation_file,
+    prepare_page as prepare_estimation_page,
+    upload_estimation,
+    upload_ledger,
+)
+from estimation_workbook import file_digest
+from property_destination import get_network_trace
+from property_runner import ContextPool, run_job
+from tracing import tracer
+
+
+# === Job queues ===
+REQUIRED_FIELDS = {"property": "property_id", "estimation": "estimation_id"}
+
+
+def parse_job(payload, default_id):
+    # A payload that isn't a JSON object still becomes a job, so it can be completed
+    # with an error instead of stopping the worker or being claimed again forever
+    try:
+        job = json.loads(payload)
+    except ValueError as e:
+        return {"id": default_id, "invalid": f"bad JSON: {e}"}
+    if not isinstance(job, dict):
+        return {"id": default_id, "invalid": "job is not a JSON object"}
+    job.setdefault("id", default_id)
+    return job
+
+
+def validate_job(job):
+    # Returns why the job can't run, or None
+    if "invalid" in job:
+        return job["invalid"]
+    kind = job.get("type", "property")
+    if kind not in REQUIRED_FIELDS:
+        return f"unknown job type {kind!r}"
+    if not job.get(REQUIRED_FIELDS[kind]):
+        return f"{kind} job without {REQUIRED_FIELDS[kind]}"
+    return None
+
+
+class JsonlQueue:
+
+    # Jobs are appended to a JSONL file, one object per line, e.g.
+    # {"id": "p-1", "type": "property", "property_id": "123", "takeoff_csv": "takeoff_data.csv"}
+    # {"id": "e-1", "type": "estimation", "estimation_id": "456", "file": "aspire_upload_example.xlsx"}
+    # {"id": "e-2", "type": "estimation", "estimation_id": "456", "source": "estimate_rows.csv"}
+    # Results go to <path>.results.jsonl; jobs with a result are skipped after a restart.
+    def __init__(self, path):
+        self.path = path
+        self.results_path = f"{path}.results.jsonl"
+        self.offset = 0
+        self.line_number = 0
+        self.lock = threading.Lock()
+        self.done = set()
+        if os.path.exists(self.results_path):
+            with open(self.results_path) as f:
+                self.done = {json.loads(line)["job_id"] for line in f if line.strip()}
+
+    def claim(self):
+        if not os.path.exists(self.path):
+            return None
+        with self.lock, open(self.path) as f:
+            f.seek(self.offset)
+            while True:
+                line = f.readline()
+                if not line.endswith("\n"):
+                    # Nothing new, or a line still being written
+                    return None
+                self.offset = f.tell()
+                self.line_number += 1
+                if not line.strip():
+                    continue
+                job = parse_job(line, f"line-{self.line_number}")
+                if job["id"] not in self.done:
+                    self.done.add(job["id"])
+                    return job
+
+    def complete(self, job, result):
+        with self.lock, open(self.results_path, "a") as f:
+            f.write(json.dumps({"job_id": job["id"], **result}) + "\n")
+
+
+class SqliteQueue:
+
+    # Same job objects, stored in a jobs table; several workers can share the file.
+    # A job left running longer than lease_seconds (its worker was killed) is claimed again.
+    def __init__(self, path, lease_seconds=None):
+        self.path = path
+        self.lease_seconds = lease_seconds or float(os.getenv('ASPIRE_WORKER_LEASE_SECONDS', 2 * 60 * 60))
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'queued', "
+                "result TEXT, created_at REAL, started_at REAL, finished_at REAL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def enqueue(self, job):
+        with self._connect() as db:
+            db.execute("INSERT INTO jobs (payload, created_at) VALUES (?, ?)", (json.dumps(job), time.time()))
+
+    def claim(self):
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute(
+                "SELECT id, payload, status FROM jobs WHERE status = 'queued' OR (status = 'running' AND started_at < ?) "
+                "ORDER BY id LIMIT 1",
+                (time.time() - self.lease_seconds,),
+            ).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            if row[2] == "running":
+                print(f"↩️ Reclaiming job {row[0]}: its worker stopped more than {self.lease_seconds:.0f}s ago without finishing it")
+            db.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (time.time(), row[0]))
+            db.execute("COMMIT")
+        finally:
+            db.close()
+        job = parse_job(row[1], row[0])
+        job["id"] = row[0]
+        return job
+
+    def complete(self, job, result):
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, result = ?, finished_at = ? WHERE id = ?",
+                (result["status"], json.dumps(result), time.time(), job["id"]),
+            )
+
+
+def open_queue(path):
+    return SqliteQueue(path) if path.endswith((".db", ".sqlite", ".sqlite3")) else JsonlQueue(path)
+
+
+# === Worker ===
+async def run_estimation_job(pool, estimation_id, file_path=None, source=None):
+    started = time.monotonic()
+    result = {"estimation_id": estimation_id, "file": file_path, "source": source, "status": "ok", "error": None}
+    try:
+        if source or not file_path:
+            # Without either, the flow's default workbook (ASPIRE_ESTIMATION_FILE) is uploaded
+            file_path, digest = await asyncio.to_thread(prepare_estimation_file, estimation_id, source)
+        else:
+            digest = await asyncio.to_thread(file_digest, file_path)
+        result["file"] = str(file_path)
+
+        if upload_ledger.is_uploaded(estimation_id, digest):
+            result["status"] = "unchanged"
+        else:
+            async with pool.context() as slot:
+                uploaded = await upload_estimation(
+                    pool.browser, slot["context"], slot["page"], estimation_id, os.path.abspath(file_path),
+                    session_cache=slot["session_cache"], restore=slot["jobs"] == 0, digest=digest,
+                )
+            if not uploaded:
+                result["status"], result["error"] = "error", "the agent did not finish the import"
+    except Exception as e:
+        print(f"❌ Estimation {estimation_id} failed: {e}")
+        result["status"], result["error"] = "error", str(e)
+
+    result["seconds"] = round(time.monotonic() - started, 1)
+    print(f"{'❌' if result['status'] == 'error' else '✅'} Estimation {estimation_id}: {result['status']} in {result['seconds']}s")
+    return result
+
+
+class Worker:
+
+    # Keeps one Chromium process and a few logged-in contexts per job type warm,
+    # and feeds them jobs from the queue until stopped
+    def __init__(self, queue, concurrency=2, max_jobs_per_context=50, max_heap_mb=512, poll_interval=2.0, exit_when_empty=False,
+                 export_every=100):
+        self.queue = queue
+        self.export_every = export_every
+        self.jobs_done = 0
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.exit_when_empty = exit_when_empty
+        self.stopping = asyncio.Event()
+        self.latencies = []
+        pool_options = {"max_jobs": max_jobs_per_context, "max_heap_mb": max_heap_mb}
+        self.pools = {
+            "property": ContextPool(get_browser(), concurrency, **pool_options),
+            "estimation": ContextPool(get_browser(), concurrency, prepare=prepare_estimation_page, **pool_options),
+        }
+
+    async def run_one(self, job):
+        error = validate_job(job)
+        if error:
+            print(f"❌ Rejected job {job['id']}: {error}")
+            return {"status": "error", "error": error, "seconds": 0}
+
+        started = time.monotonic()
+        try:
+            if job.get("type", "property") == "property":
+                return await run_job(self.pools["property"], job["property_id"], job.get("takeoff_csv", "takeoff_data.csv"))
+            return await run_estimation_job(self.pools["estimation"], job["estimation_id"], job.get("file"), job.get("source"))
+        except Exception as e:
+            # One bad job must not stop the other loops or leave the job claimed forever
+            print(f"❌ Job {job['id']} failed: {e}")
+            return {"status": "error", "error": str(e), "seconds": round(time.monotonic() - started, 1)}
+
+    async def _loop(self):
+        while not self.stopping.is_set():
+            job = await asyncio.to_thread(self.queue.claim)
+            if job is None:
+                if self.exit_when_empty:
+                    return
+                try:
+                    await asyncio.wait_for(self.stopping.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            enqueued_at = job.get("enqueued_at")
+            queued_for = time.time() - enqueued_at if isinstance(enqueued_at, (int, float)) else None
+            with tracer.span("worker.job", type=job.get("type", "property")):
+                result = await self.run_one(job)
+            tracer.count(f"worker_jobs_{result['status']}")
+            if queued_for is not None:
+                result["queued_seconds"] = round(queued_for, 1)
+            self.latencies.append(result["seconds"])
+            await asyncio.to_thread(self.queue.complete, job, result)
+            self.jobs_done += 1
+            if self.export_every and self.jobs_done % self.export_every == 0:
+                # Timings go out in windows of export_every jobs so the tracer stays small
+                tracer.export(stem=f"{tracer.name}_{time.strftime('%Y-%m-%d_%H:%M:%S', time.localtime(tracer.started_at))}_{self.jobs_done}")
+                tracer.reset()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stopping.set)
+
+        print(f"🚀 Worker started with {self.concurrency} contexts per job type")
+        try:
+            await asyncio.gather(*(self._loop() for _ in range(self.concurrency)))
+        finally:
+            for pool in self.pools.values():
+                await pool.close()
+        return self.summary()
+
+    def summary(self):
+        if not self.latencies:
+            return "Worker processed no jobs."
+        ordered = sorted(self.latencies)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return (f"Worker processed {len(ordered)} jobs: median {statistics.median(ordered):.1f}s, "
+                f"p95 {p95:.1f}s, max {ordered[-1]:.1f}s per job")
+
+
+async def main(args):
+    tracer.name = "worker"
+    worker = Worker(
+        open_queue(args.queue),
+        concurrency=args.concurrency,
+        max_jobs_per_context=args.max_jobs_per_context,
+        max_heap_mb=args.max_heap_mb,
+        poll_interval=args.poll_interval,
+        exit_when_empty=args.exit_when_empty,
+        export_every=args.export_every,
+    )
+    try:
+        summary = await worker.run()
+    finally:
+        try:
+            await get_browser().close()
+        except Exception as e:
+            print(f"⚠️ Warning: Failed to close the browser - {e}")
+        await get_network_trace().close()
+        await get_estimation_trace().close()
+
+    print(summary)
+    get_slack().sendMessageToChannel(summary)
+    await get_slack().aclose()
+    tracer.export()
+
+
+def cli(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Long-running worker that keeps Chromium warm and consumes Aspire jobs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Consume jobs from the queue")
+    run_parser.add_argument("--queue", default=os.getenv('ASPIRE_WORKER_QUEUE', 'jobs.jsonl'), help=".jsonl file or .db SQLite queue")
+    run_parser.add_argument("--concurrency", type=int, default=int(os.getenv('ASPIRE_WORKER_CONCURRENCY', 2)))
+    run_parser.add_argument("--max-jobs-per-context", type=int, default=int(os.getenv('ASPIRE_WORKER_MAX_JOBS_PER_CONTEXT', 50)))
+    run_parser.add_argument("--max-heap-mb", type=int, default=int(os.getenv('ASPIRE_WORKER_MAX_HEAP_MB', 512)))
+    run_parser.add_argument("--poll-interval", type=float, default=2.0)
+    run_parser.add_argument("--exit-when-empty", action="store_true", help="Stop once the queue is drained")
+    run_parser.add_argument("--export-every", type=int, default=int(os.getenv('ASPIRE_WORKER_EXPORT_EVERY', 100)),
+                            help="Export and reset the timings every N jobs; 0 exports only at exit")
+
+    enqueue_parser = subparsers.add_parser("enqueue", help="Add a job to a SQLite or JSONL queue")
+    enqueue_parser.add_argument("--queue", default=os.getenv('ASPIRE_WORKER_QUEUE', 'jobs.jsonl'))
+    enqueue_parser.add_argument("job", help='JSON object, e.g. {"type": "property", "property_id": "123"}')
+
+    args = parser.parse_args(argv)
+    if args.command == "enqueue":
+        job = {**json.loads(args.job), "enqueued_at": time.time()}
+        queue = open_queue(args.queue)
+        if isinstance(queue, SqliteQueue):
+            queue.enqueue(job)
+        else:
+            with open(args.queue, "a") as f:
+                f.write(json.dumps(job) + "\n")
+        print(f"✅ Queued {job} on {args.queue}")
+    else:
+        asyncio.run(main(args))
+
+
+if __name__ == '__main__':
+    cli()